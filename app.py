@@ -1,86 +1,435 @@
-from flask import Flask, request, render_template, redirect, url_for
-from transformers import pipeline
+from flask import Flask, Request, request, g, render_template, redirect, url_for, jsonify, Response, stream_with_context, make_response, send_from_directory
+from werkzeug.utils import secure_filename
+from markupsafe import Markup, escape
 from collections import defaultdict
-import re
+from concurrent.futures import as_completed
+from contextlib import contextmanager
+import functools
+import gc
 import os
-import sqlite3
-from openai import OpenAI
+import json
+import time
+import queue
+import threading
+import uuid
+import tempfile
+import hashlib
+import hmac
+import re
+import sys
+import click
+from datetime import datetime
 from dotenv import load_dotenv
+from sentences import SentenceIndex
+from models import ModelRegistry
+from db import Database
+from cache import ResultCache, normalize_transcript
+from jobs import JobQueue, QueueFull
+from batching import BatchedPipeline, MicroBatcher, SingleFlight
+from transcription import ChunkedTranscriber, create_transcriber
+from embeddings import EmbeddingIndex, SentenceEmbedder, EMBEDDING_MODEL
+from engines import load_pipeline, model_version, accuracy_report
+from routing import ModelTier, TierRouter
+from metrics import MetricsRegistry
+from tracing import Tracer
+from concerns import ConcernScorer, CONCERN_LABELS, HYPOTHESIS_TEMPLATE
+from breakthroughs import find_breakthroughs, BREAKTHROUGH_PATTERN, MAX_BREAKTHROUGHS
+from summarization import summarize_transcript, stream_summary, SUMMARY_KWARGS, CHUNK_TOKENS
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+class SpooledRequest(Request):
+    # Uploads stay in memory up to UPLOAD_SPOOL_BYTES and roll over to an
+    # anonymous per-request temp file beyond that; either way the stream is
+    # private to the request and gone once it is closed
+    spool_bytes = int(os.getenv("UPLOAD_SPOOL_BYTES", str(8 * 1024 * 1024)))
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=self.spool_bytes, mode="rb+")
 
 app = Flask(__name__)
+app.request_class = SpooledRequest
 
-# Load summarizer
-summarizer = pipeline(
-    "summarization",
-    model="philschmid/bart-large-cnn-samsum"
+# Prometheus-style metrics, scraped from /metrics. With METRICS_ENABLED=0
+# every update is a no-op and the endpoint is off.
+metrics = MetricsRegistry(enabled=os.getenv("METRICS_ENABLED", "1") != "0")
+REQUEST_SECONDS = metrics.histogram(
+    "therapai_request_seconds", "HTTP request latency in seconds.", ["endpoint", "method", "status"]
+)
+STAGE_SECONDS = metrics.histogram(
+    "therapai_stage_seconds", "Time spent in each analysis stage in seconds.", ["stage", "tier"]
+)
+DB_SECONDS = metrics.histogram(
+    "therapai_db_seconds", "SQLite statement and transaction latency in seconds.", ["database", "operation"]
+)
+TOKENS = metrics.counter(
+    "therapai_tokens_total", "Input tokens processed by each model.", ["model", "tier"]
 )
 
-# Load classifier explicitly (instead of relying on default)
-classifier = pipeline(
-    "zero-shot-classification",
-    model="facebook/bart-large-mnli",  # Same default, just now explicit
-    revision="d7645e1"  # Optional: version locking for reproducibility
+# Span trees for traced requests, kept for /debug/traces. TRACE_LOG_PATH
+# also appends every finished trace there as one JSON line.
+tracer = Tracer(
+    capacity=int(os.getenv("TRACE_BUFFER_SIZE", "500")),
+    path=os.getenv("TRACE_LOG_PATH") or None,
+    enabled=os.getenv("TRACING_ENABLED", "1") != "0"
 )
 
-def extract_insights(text):
-    # Analyze core concerns
-    concerns = classifier(
-        text,
-        candidate_labels=["anxiety", "depression", "relationships", "work stress", "family issues", "self-esteem"],
-        multi_label=True
+@contextmanager
+def stage(name, tier=None, **attributes):
+    # Times one pipeline stage and records it as a span of the current trace
+    if tier:
+        attributes["tier"] = tier.name
+    with tracer.span(name, **attributes), STAGE_SECONDS.time(stage=name, tier=tier.name if tier else ""):
+        yield
+
+def db_observer(database):
+    # Only hooked in when metrics or tracing are on, so with both off a
+    # query costs nothing extra
+    if not metrics.enabled and not tracer.enabled:
+        return None
+    def observe(operation, seconds):
+        DB_SECONDS.observe(seconds, database=database, operation=operation)
+        tracer.add_span(f"db.{operation}", seconds, database=database)
+    return observe
+
+class TracedPipeline:
+    # Records a span per summarization window. Through a BatchedPipeline the
+    # windows are enqueued together, so they still share batches, and each
+    # span ends when that window's result comes back. A plain pipeline runs
+    # a call's windows as one unit, so it gets one span per call.
+    def __init__(self, pipeline, name):
+        self.pipeline = pipeline
+        self.tokenizer = pipeline.tokenizer
+        self.name = name
+
+    def __call__(self, inputs, **kwargs):
+        enqueue = getattr(self.pipeline, "enqueue", None)
+        if enqueue is None:
+            with tracer.span(self.name, windows=len(inputs) if isinstance(inputs, list) else 1):
+                return self.pipeline(inputs, **kwargs)
+
+        started = time.perf_counter()
+        futures = enqueue(inputs, **kwargs)
+        windows = {future: window for window, future in enumerate(futures)}
+        seconds = {}
+        for future in as_completed(futures):
+            seconds[windows[future]] = time.perf_counter() - started
+        for window in range(len(futures)):
+            tracer.add_span(self.name, seconds[window], window=window)
+        return [future.result() for future in futures]
+
+# Operators holding PROFILE_TOKEN can profile a single traced request by
+# sending X-Profile: 1 (or ?profile=1) with X-Profile-Token. Without the
+# token set, profiling is off altogether. Profiles are keyed by trace id,
+# so with tracing disabled there are none.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("database", "profiles"))
+# Both profilers are process-wide, so one profiled request at a time
+profile_lock = threading.Lock()
+# torch.profiler only records operators on the thread that started it, so
+# a profiled request runs its models on its own thread rather than handing
+# them to the micro-batchers
+profiling = threading.local()
+
+def profiling_here():
+    return getattr(profiling, "active", False)
+
+def profile_requested():
+    if not PROFILE_TOKEN:
+        return False
+    if request.headers.get("X-Profile") != "1" and request.args.get("profile") != "1":
+        return False
+    return hmac.compare_digest(request.headers.get("X-Profile-Token", ""), PROFILE_TOKEN)
+
+@contextmanager
+def profiled(root):
+    # The profilers are only imported once a profile is asked for
+    if root is None or not profile_requested() or not profile_lock.acquire(blocking=False):
+        yield
+        return
+    try:
+        from profiling import profile_request
+        root.attributes["profiled"] = True
+        with profile_request(root.trace_id, PROFILE_DIR):
+            profiling.active = True
+            try:
+                yield
+            finally:
+                profiling.active = False
+    finally:
+        profile_lock.release()
+
+def traced(view):
+    # Runs the view as the root span of a new trace and reports its id
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with tracer.trace(request.endpoint, method=request.method, path=request.path) as root, profiled(root):
+            response = make_response(view(*args, **kwargs))
+        if root is not None:
+            response.headers["X-Trace-Id"] = root.trace_id
+        return response
+    return wrapper
+
+SUMMARIZER_MODEL = "philschmid/bart-large-cnn-samsum"
+SUMMARIZER_REVISION = "main"
+CLASSIFIER_MODEL = "facebook/bart-large-mnli"
+CLASSIFIER_REVISION = "d7645e1"
+
+# Inference engine per model: "torch" (FP32), "int8" (dynamically quantized)
+# or "onnx" (ONNX Runtime). Check a non-default engine with
+# `flask --app app check-engines` before switching production to it.
+SUMMARIZER_ENGINE = os.getenv("SUMMARIZER_ENGINE", "torch")
+CLASSIFIER_ENGINE = os.getenv("CLASSIFIER_ENGINE", "torch")
+
+# Minimum entailment score for a concern to be reported
+CONCERN_THRESHOLD = 0.3
+
+# Model tiers, best quality first. Short transcripts, heavy load or a tight
+# latency budget route an analysis to a faster tier (see TierRouter);
+# MODEL_TIERS picks which tiers this server loads.
+TIERS = [
+    ModelTier(
+        "full",
+        SUMMARIZER_MODEL, SUMMARIZER_REVISION,
+        CLASSIFIER_MODEL, CLASSIFIER_REVISION,
+        summarize_seconds_per_word=0.010,
+        insights_seconds_per_word=0.004
+    ),
+    ModelTier(
+        "distilled",
+        "philschmid/distilbart-cnn-12-6-samsum", "main",
+        "valhalla/distilbart-mnli-12-3", "main",
+        summarize_seconds_per_word=0.005,
+        insights_seconds_per_word=0.002
+    ),
+]
+MODEL_TIERS = os.getenv("MODEL_TIERS", ",".join(tier.name for tier in TIERS)).split(",")
+TIERS = [tier for tier in TIERS if tier.name in MODEL_TIERS]
+
+# Default per-request latency budget in seconds; unset means no deadline
+LATENCY_BUDGET_SECONDS = float(os.getenv("LATENCY_BUDGET_SECONDS", "0")) or None
+
+# Models are loaded on first use, or in the background once the server
+# starts, so importing the app and model-free routes never wait on them
+models = ModelRegistry()
+
+# Concurrent requests share padded batches instead of contending for the
+# same cores one transcript at a time
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "30"))
+
+def register_tier(tier):
+    # Load summarizer
+    @models.register(f"summarizer:{tier.name}")
+    def load_summarizer(registry):
+        return load_pipeline("summarization", tier.summarizer_model, tier.summarizer_revision, SUMMARIZER_ENGINE)
+
+    # Load classifier explicitly (instead of relying on default)
+    @models.register(f"classifier:{tier.name}")
+    def load_classifier(registry):
+        return load_pipeline(
+            "zero-shot-classification",
+            tier.classifier_model,
+            tier.classifier_revision,  # Optional: version locking for reproducibility
+            CLASSIFIER_ENGINE
+        )
+
+    # Score every concern label in one padded batch instead of one NLI pass per label
+    @models.register(f"concern_scorer:{tier.name}")
+    def load_concern_scorer(registry):
+        classifier = registry.get(f"classifier:{tier.name}")
+        observe_batch = None
+        if metrics.enabled:
+            def observe_batch(pairs, tokens, seconds):
+                TOKENS.inc(tokens, model="classifier", tier=tier.name)
+                STAGE_SECONDS.observe(seconds, stage="classify_batch", tier=tier.name)
+        return ConcernScorer(
+            classifier.model,
+            classifier.tokenizer,
+            batch_size=int(os.getenv("CONCERN_BATCH_SIZE", "8")),
+            observe_batch=observe_batch
+        )
+
+    @models.register(f"summary_batcher:{tier.name}")
+    def load_summary_batcher(registry):
+        return BatchedPipeline(
+            registry.get(f"summarizer:{tier.name}"),
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS
+        )
+
+    @models.register(f"concern_batcher:{tier.name}")
+    def load_concern_batcher(registry):
+        return MicroBatcher(
+            registry.get(f"concern_scorer:{tier.name}").score_many,
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            name=f"concern-batcher-{tier.name}"
+        )
+
+for tier in TIERS:
+    register_tier(tier)
+
+router = TierRouter(
+    TIERS,
+    queued=lambda: jobs.queued_count(),
+    short_words=int(os.getenv("ROUTER_SHORT_WORDS", "300")),
+    overload_depth=int(os.getenv("ROUTER_OVERLOAD_DEPTH", "8")),
+    parallelism=BATCH_MAX_SIZE
+)
+
+# "openai" for the hosted API, "local" for int8 Whisper on this machine's
+# CPU, "stub" for a stand-in that needs neither a key nor a model
+TRANSCRIPTION_BACKEND = os.getenv("TRANSCRIPTION_BACKEND", "openai")
+
+def transcriber_options(backend):
+    if backend == "openai":
+        return {
+            "api_key": os.getenv("OPENAI_API_KEY"),
+            "model": os.getenv("OPENAI_TRANSCRIBE_MODEL", "gpt-4o-transcribe"),
+        }
+    if backend == "local":
+        return {
+            "model": os.getenv("WHISPER_MODEL", "small"),
+            "compute_type": os.getenv("WHISPER_COMPUTE_TYPE", "int8"),
+            "cpu_threads": int(os.getenv("WHISPER_CPU_THREADS", "0")),
+            "workers": int(os.getenv("TRANSCRIBE_WORKERS", "4")),
+        }
+    return {}
+
+# Long WAV recordings are split into overlapping segments and transcribed
+# in parallel; a failed segment is retried on its own
+@models.register("transcriber")
+def load_transcriber(registry):
+    return ChunkedTranscriber(
+        create_transcriber(TRANSCRIPTION_BACKEND, **transcriber_options(TRANSCRIPTION_BACKEND)),
+        segment_seconds=float(os.getenv("TRANSCRIBE_SEGMENT_SECONDS", "300")),
+        overlap_seconds=float(os.getenv("TRANSCRIBE_OVERLAP_SECONDS", "5")),
+        workers=int(os.getenv("TRANSCRIBE_WORKERS", "4")),
+        retries=int(os.getenv("TRANSCRIBE_RETRIES", "2"))
     )
-    # Find breakthroughs using key phrases
-    breakthrough_patterns = [
-        r"(?i)(?:I\s+)?(?:realized|understood|discovered|learned)",
-        r"(?i)now\s+I\s+(?:see|understand|know)",
-        r"(?i)it\s+(?:becomes|became)\s+clear"
-    ]
 
-    def find_sentence_boundaries(text, start_pos, end_pos):
-        # Find the start of the sentence
-        sentence_start = start_pos
-        while sentence_start > 0 and text[sentence_start-1] not in '.!?':
-            sentence_start -= 1
-        if sentence_start > 0:
-            sentence_start += 1  # Skip the period and space
-
-        # Find the end of the sentence
-        sentence_end = end_pos
-        while sentence_end < len(text) and text[sentence_end] not in '.!?':
-            sentence_end += 1
-        if sentence_end < len(text):
-            sentence_end += 1  # Include the period
-
-        return sentence_start, sentence_end
-
-    breakthroughs = []
-    for pattern in breakthrough_patterns:
-        matches = re.finditer(pattern, text)
-        for match in matches:
-            # Get complete sentences around the breakthrough
-            start, end = find_sentence_boundaries(
+@models.register("embedder")
+def load_embedder(registry):
+    return SentenceEmbedder(os.getenv("EMBEDDING_MODEL", EMBEDDING_MODEL))
+
+@app.before_request
+def warm_models():
+    # Under `flask run` or a WSGI server the first request kicks off loading
+    models.start_background()
+
+def extract_insights(text, tier, sentence_index=None):
+    def analyze():
+        started = time.perf_counter()
+        # Analyze core concerns
+        with stage("classify", tier, words=len(text.split())):
+            if profiling_here():
+                concerns = models.get(f"concern_scorer:{tier.name}").score(text)
+            else:
+                concerns = models.get(f"concern_batcher:{tier.name}").submit(text)
+        router.observe(tier, "insights", len(text.split()), time.perf_counter() - started)
+        # Find breakthroughs using key phrases
+        with stage("breakthroughs", tier):
+            breakthroughs = find_breakthroughs(text, index=sentence_index)
+
+        scores = {label: score for label, score in zip(concerns["labels"], concerns["scores"]) if score > CONCERN_THRESHOLD}
+        return {
+            "concerns": list(scores),
+            "concern_scores": scores,
+            "breakthroughs": breakthroughs
+        }
+
+    return cache.get_or_compute("insights", text, insights_params(tier), analyze)
+
+def summarize(text, tier, sentence_index=None, emit=None):
+    # emit(event, data), if given, receives map progress and the decoded
+    # text of the final pass as it streams
+    def compute():
+        progress = finish = None
+        batcher = models.get(f"summarizer:{tier.name}" if profiling_here() else f"summary_batcher:{tier.name}")
+        if tracer.current():
+            batcher = TracedPipeline(batcher, "generate")
+        if emit:
+            summarizer = models.get(f"summarizer:{tier.name}")
+            progress = lambda pass_number, done, total: emit(
+                "progress", {"stage": "summarize", "pass": pass_number, "done": done, "total": total}
+            )
+
+            def finish(chunk, **kwargs):
+                # Generation runs on a helper thread, so the span goes here
+                with tracer.span("generate_stream"):
+                    return stream_summary(summarizer, chunk, lambda text: emit("token", {"text": text}), **kwargs)
+
+        stats = {}
+        started = time.perf_counter()
+        with stage("summarize", tier):
+            summary_text = summarize_transcript(
+                batcher,
                 text,
-                max(0, match.start() - 150),
-                min(len(text), match.end() + 150)
+                index=sentence_index,
+                progress=progress,
+                finish=finish,
+                stats=stats
             )
-            breakthrough_text = text[start:end].strip()
-            if breakthrough_text and len(breakthrough_text) > 10:  # Ensure we have meaningful content
-                breakthroughs.append(breakthrough_text)
+        router.observe(tier, "summarize", len(text.split()), time.perf_counter() - started)
+        STAGE_SECONDS.observe(stats.get("chunk_seconds", 0.0), stage="tokenize", tier=tier.name)
+        STAGE_SECONDS.observe(stats.get("generate_seconds", 0.0), stage="generate", tier=tier.name)
+        TOKENS.inc(stats.get("tokens", 0), model="summarizer", tier=tier.name)
+        return summary_text
 
-    return {
-        "concerns": [label for label, score in zip(concerns["labels"], concerns["scores"]) if score > 0.3],
-        "breakthroughs": breakthroughs[:3]  # Limit to top 3 breakthroughs
-    }
+    return cache.get_or_compute("summary", text, summary_params(tier), compute)
+
+# Columns added to sessions after the original schema; init_db adds any
+# that an existing database is missing
+SESSION_COLUMNS = {
+    "transcript_hash": "TEXT",
+    "source": "TEXT",
+    "summarizer_model": "TEXT",
+    "classifier_model": "TEXT",
+    "transcribe_seconds": "REAL",
+    "summarize_seconds": "REAL",
+    "insights_seconds": "REAL",
+    "version": "INTEGER NOT NULL DEFAULT 0",  # Bumped on every update, for optimistic concurrency
+    "summary_preview": "TEXT",  # What the dashboard shows, kept in sync by triggers
+    "summarizer_tier": "TEXT",
+    "classifier_tier": "TEXT",
+}
+
+# Characters of the summary shown per row on the dashboard
+PREVIEW_CHARS = 100
+PREVIEW_SQL = f"substr(summary, 1, {PREVIEW_CHARS}) || CASE WHEN length(summary) > {PREVIEW_CHARS} THEN '...' ELSE '' END"
+
+# bm25 column weights for (transcript, summary)
+SEARCH_WEIGHTS = "1.0, 2.0"
+SEARCH_PAGE_SIZE = 20
+# Private-use characters mark snippet highlights until the text is escaped
+SNIPPET_OPEN, SNIPPET_CLOSE = "\ue000", "\ue001"
+
+DASHBOARD_PAGE_SIZE = 50
+DASHBOARD_MAX_PAGE_SIZE = 200
+
+SIMILAR_SESSIONS = 5
+SIMILAR_MAX_SESSIONS = 50
+
+# All queries go through a shared pool of long-lived connections (WAL, tuned pragmas,
+# prepared-statement cache) instead of a fresh connect per request
+os.makedirs('database', exist_ok=True)
+db = Database(
+    'database/therapy_sessions.db',
+    mmap_bytes=int(os.getenv("DB_MMAP_BYTES", str(256 * 1024 * 1024))),
+    observe=db_observer("sessions")
+)
+
+# One float16 embedding per session, memory-mapped next to the database
+embedding_index = EmbeddingIndex(
+    os.getenv("EMBEDDINGS_PATH", "database/session_embeddings.npy"),
+    ivf_threshold=int(os.getenv("EMBEDDINGS_IVF_THRESHOLD", "20000"))
+)
 
 # Initialize the database
 def init_db():
-    conn = sqlite3.connect('database/therapy_sessions.db')
-    cursor = conn.cursor()
-    cursor.execute('''
+    db.execute('''
     CREATE TABLE IF NOT EXISTS sessions (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         date TEXT NOT NULL,
@@ -88,141 +437,907 @@ def init_db():
         summary TEXT NOT NULL
     )
     ''')
-    conn.commit()
-    conn.close()
+    existing = {row[1] for row in db.fetchall("PRAGMA table_info(sessions)")}
+    added = [column for column in SESSION_COLUMNS if column not in existing]
+    for column in added:
+        db.execute(f"ALTER TABLE sessions ADD COLUMN {column} {SESSION_COLUMNS[column]}")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_sessions_transcript_hash ON sessions(transcript_hash)")
+    # Covering index for the dashboard: pages are served from the index alone,
+    # without touching rows whose transcripts spill onto overflow pages
+    db.execute("CREATE INDEX IF NOT EXISTS idx_sessions_dashboard ON sessions(date DESC, id DESC, summary_preview)")
+
+    # The dashboard reads only the preview, never the full summary
+    db.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS sessions_preview_insert AFTER INSERT ON sessions BEGIN
+        UPDATE sessions SET summary_preview = {PREVIEW_SQL.replace("summary", "NEW.summary")} WHERE id = NEW.id;
+    END
+    ''')
+    db.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS sessions_preview_update AFTER UPDATE OF summary ON sessions BEGIN
+        UPDATE sessions SET summary_preview = {PREVIEW_SQL.replace("summary", "NEW.summary")} WHERE id = NEW.id;
+    END
+    ''')
+    # Rows from before the preview column get one from a single full scan,
+    # run only when the column is added; the triggers cover every row after
+    if "summary_preview" in added:
+        db.execute(f"UPDATE sessions SET summary_preview = {PREVIEW_SQL}")
+
+    db.execute('''
+    CREATE TABLE IF NOT EXISTS session_concerns (
+        session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+        label TEXT NOT NULL,
+        score REAL NOT NULL,
+        PRIMARY KEY (session_id, label)
+    )
+    ''')
+    db.execute('''
+    CREATE TABLE IF NOT EXISTS session_breakthroughs (
+        session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        PRIMARY KEY (session_id, position)
+    )
+    ''')
+
+    init_search_index()
+
+def init_search_index():
+    # FTS5 index over transcripts and summaries. It stores no copy of the
+    # text (content='sessions') and triggers keep it in step with the table.
+    created = not db.fetchone("SELECT 1 FROM sqlite_master WHERE name = 'sessions_fts'")
+    db.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5(
+        transcript,
+        summary,
+        content='sessions',
+        content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    ''')
+    db.execute('''
+    CREATE TRIGGER IF NOT EXISTS sessions_fts_insert AFTER INSERT ON sessions BEGIN
+        INSERT INTO sessions_fts (rowid, transcript, summary) VALUES (NEW.id, NEW.transcript, NEW.summary);
+    END
+    ''')
+    db.execute('''
+    CREATE TRIGGER IF NOT EXISTS sessions_fts_delete AFTER DELETE ON sessions BEGIN
+        INSERT INTO sessions_fts (sessions_fts, rowid, transcript, summary) VALUES ('delete', OLD.id, OLD.transcript, OLD.summary);
+    END
+    ''')
+    db.execute('''
+    CREATE TRIGGER IF NOT EXISTS sessions_fts_update AFTER UPDATE OF transcript, summary ON sessions BEGIN
+        INSERT INTO sessions_fts (sessions_fts, rowid, transcript, summary) VALUES ('delete', OLD.id, OLD.transcript, OLD.summary);
+        INSERT INTO sessions_fts (rowid, transcript, summary) VALUES (NEW.id, NEW.transcript, NEW.summary);
+    END
+    ''')
+    # Rank with bm25, weighting summary hits above transcript hits
+    db.execute(f"INSERT INTO sessions_fts (sessions_fts, rank) VALUES ('rank', 'bm25({SEARCH_WEIGHTS})')")
+    if created:
+        rebuild_search_index()
+
+def rebuild_search_index():
+    db.execute("INSERT INTO sessions_fts (sessions_fts) VALUES ('rebuild')")
 
 init_db()
 
+# Everything that can change a cached result is part of its key, so a model,
+# revision or parameter change invalidates old entries automatically
+def summary_params(tier):
+    return {
+        "model": tier.summarizer_model,
+        "revision": tier.summarizer_revision,
+        "engine": SUMMARIZER_ENGINE,
+        "generation": SUMMARY_KWARGS,
+        "chunk_tokens": CHUNK_TOKENS,
+    }
+
+def insights_params(tier):
+    return {
+        "model": tier.classifier_model,
+        "revision": tier.classifier_revision,
+        "engine": CLASSIFIER_ENGINE,
+        "labels": CONCERN_LABELS,
+        "hypothesis_template": HYPOTHESIS_TEMPLATE,
+        "threshold": CONCERN_THRESHOLD,
+        "breakthrough_pattern": BREAKTHROUGH_PATTERN.pattern,
+        "max_breakthroughs": MAX_BREAKTHROUGHS,
+        "result_format": 2,  # Results carry concern_scores
+    }
+
+cache = ResultCache(
+    Database(os.getenv("CACHE_PATH", "database/result_cache.db"), observe=db_observer("cache")),
+    memory_entries=int(os.getenv("CACHE_MEMORY_ENTRIES", "512")),
+    max_bytes=int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+)
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    # Liveness: the process is up and serving, models or not
+    return jsonify(status="ok")
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    # Readiness: every model is loaded and analysis routes won't block
+    ready = models.ready()
+    return jsonify(
+        status="ready" if ready else "loading",
+        models=models.status(),
+        router=router.status()
+    ), 200 if ready else 503
+
 @app.route("/", methods=["GET"])
 def home():
     return render_template("index.html")
 
+def summarizer_version(tier):
+    return model_version(tier.summarizer_model, tier.summarizer_revision, SUMMARIZER_ENGINE)
+
+def classifier_version(tier):
+    return model_version(tier.classifier_model, tier.classifier_revision, CLASSIFIER_ENGINE)
+
+def transcript_hash(transcript):
+    return hashlib.sha256(normalize_transcript(transcript).encode("utf-8")).hexdigest()
+
+def analyze_transcript(transcript, tier, emit=None):
+    # Sentence offsets are shared by the chunker and the breakthrough detector
+    sentence_index = SentenceIndex(transcript)
+
+    # Generate summary
+    started = time.perf_counter()
+    summary_text = summarize(transcript, tier, sentence_index, emit)
+    summarized = time.perf_counter()
+    if emit:
+        emit("summary", {"summary": summary_text})
+
+    # Extract insights
+    insights = extract_insights(transcript, tier, sentence_index)
+    finished = time.perf_counter()
+    if emit:
+        emit("concerns", {"concerns": insights["concerns"], "concern_scores": insights["concern_scores"]})
+        emit("breakthroughs", {"breakthroughs": insights["breakthroughs"]})
+
+    return {
+        "tier": tier.name,
+        "summary": summary_text,
+        "concerns": insights["concerns"],
+        "concern_scores": insights["concern_scores"],
+        "breakthroughs": insights["breakthroughs"],
+        "timings": {
+            "summarize_seconds": summarized - started,
+            "insights_seconds": finished - summarized,
+        }
+    }
+
+def save_session(transcript, analysis, source, transcribe_seconds=None):
+    # The session row and its concerns and breakthroughs land together or not at all
+    tier = router.tier(analysis["tier"])
+    with db.transaction() as conn:
+        cursor = conn.execute(
+            '''INSERT INTO sessions (date, transcript, summary, transcript_hash, source,
+                                   summarizer_model, classifier_model, summarizer_tier, classifier_tier,
+                                   transcribe_seconds, summarize_seconds, insights_seconds)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                transcript,
+                analysis["summary"],
+                transcript_hash(transcript),
+                source,
+                summarizer_version(tier),
+                classifier_version(tier),
+                tier.name,
+                tier.name,
+                transcribe_seconds,
+                analysis["timings"]["summarize_seconds"],
+                analysis["timings"]["insights_seconds"],
+            )
+        )
+        session_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT INTO session_concerns (session_id, label, score) VALUES (?, ?, ?)",
+            [(session_id, label, score) for label, score in analysis["concern_scores"].items()]
+        )
+        conn.executemany(
+            "INSERT INTO session_breakthroughs (session_id, position, text) VALUES (?, ?, ?)",
+            [(session_id, position, text) for position, text in enumerate(analysis["breakthroughs"])]
+        )
+    return session_id
+
+def load_insights(session_id):
+    concerns = db.fetchall("SELECT label, score FROM session_concerns WHERE session_id = ? ORDER BY score DESC", (session_id,))
+    breakthroughs = [row[0] for row in db.fetchall(
+        "SELECT text FROM session_breakthroughs WHERE session_id = ? ORDER BY position",
+        (session_id,)
+    )]
+    return concerns, breakthroughs
+
+def find_stored_analysis(transcript, tier):
+    # A session with the same transcript whose summary and insights were each
+    # produced by the model of this tier or a better one. Re-summarizing can
+    # leave a row with models from two tiers, so each is ranked on its own and
+    # a row counts as its worse one; the best and then the newest wins.
+    tiers = router.tiers[:router.rank(tier) + 1]
+    summarizers = {summarizer_version(better): rank for rank, better in enumerate(tiers)}
+    classifiers = {classifier_version(better): rank for rank, better in enumerate(tiers)}
+    sessions = [
+        (max(summarizers[row[2]], classifiers[row[3]]), -row[0], row)
+        for row in db.fetchall(
+            "SELECT id, summary, summarizer_model, classifier_model, summarizer_tier FROM sessions WHERE transcript_hash = ?",
+            (transcript_hash(transcript),)
+        )
+        if row[2] in summarizers and row[3] in classifiers
+    ]
+    if not sessions:
+        return None
+    session = min(sessions)[2]
+    concerns, breakthroughs = load_insights(session[0])
+
+    return {
+        "session_id": session[0],
+        "tier": session[4] or router.tiers[summarizers[session[2]]].name,
+        "summary": session[1],
+        "concerns": [label for label, _ in concerns],
+        "concern_scores": dict(concerns),
+        "breakthroughs": breakthroughs
+    }
+
+def analyze_session(transcript, source, transcribe_seconds=None, budget_seconds=LATENCY_BUDGET_SECONDS, emit=None):
+    # Stored sessions are served as-is; anything new is analyzed and persisted
+    if budget_seconds is not None and transcribe_seconds is not None:
+        budget_seconds = max(budget_seconds - transcribe_seconds, 0)
+    tier = router.choose(len(transcript.split()), budget_seconds)
+    stored = find_stored_analysis(transcript, tier)
+    if stored:
+        return stored
+    if emit:
+        emit("tier", {"tier": tier.name})
+    with router.track():
+        analysis = analyze_transcript(transcript, tier, emit)
+    analysis["session_id"] = save_session(transcript, analysis, source, transcribe_seconds)
+    embed_session(analysis["session_id"], transcript)
+    return analysis
+
+def embed_session(session_id, transcript):
+    # The session is already saved; a failed embedding only leaves it out of
+    # similarity results until the next embed-sessions run
+    try:
+        with stage("embed"):
+            embedding_index.add(session_id, models.get("embedder").embed(transcript))
+    except Exception:
+        app.logger.exception("Embedding session %s failed", session_id)
+
+def similar_sessions(session_id, k=SIMILAR_SESSIONS):
+    vector = embedding_index.get(session_id)
+    if vector is None:
+        return []
+    matches = embedding_index.search(vector, k, exclude={session_id})
+    if not matches:
+        return []
+    rows = {row[0]: row for row in db.fetchall(
+        f"SELECT id, date, summary_preview FROM sessions WHERE id IN ({', '.join('?' * len(matches))})",
+        [match_id for match_id, _ in matches]
+    )}
+    # Sessions deleted since they were embedded drop out here
+    return [rows[match_id] + (score,) for match_id, score in matches if match_id in rows]
+
+def render_analysis(analysis):
+    with stage("render"):
+        return render_template(
+            "index.html",
+            summary=f"<strong>Summary of your therapy session:</strong> {analysis['summary']}",
+            concerns=analysis["concerns"],
+            breakthroughs=analysis["breakthroughs"],
+            session_id=analysis.get("session_id")
+        )
+
+def transcribe(f, filename, content_type=None):
+    with stage("transcribe"):
+        return models.get("transcriber")(f, filename, content_type)
+
+def request_budget():
+    # Seconds the caller is willing to wait for the analysis
+    return request.values.get("budget_seconds", LATENCY_BUDGET_SECONDS, type=float)
+
 @app.route("/transcribe_audio", methods=["POST"])
+@traced
 def transcribe_audio():
-    audio_file = request.files.get("audio")
+    # Reading request.files is what consumes the multipart body
+    with tracer.span("upload"):
+        audio_file = request.files.get("audio")
 
     if not audio_file:
         return "No audio file uploaded", 400
 
-    # Save uploaded file to a temporary path
-    filepath = "temp_audio.wav"
-    audio_file.save(filepath)
-
-    # Transcribe using OpenAI Whisper API
+    # Stream the spooled upload straight to transcription, no copy on disk
+    started = time.perf_counter()
     try:
-        with open(filepath, "rb") as f:
-            # Correct API usage for transcription
-            transcription = client.audio.transcriptions.create(
-                model="gpt-4o-transcribe",
-                file=f
-            )
-            transcript = transcription.text
-            os.remove(filepath)
+        transcript = transcribe(
+            audio_file.stream,
+            secure_filename(audio_file.filename or "") or "audio.wav",
+            audio_file.mimetype
+        )
     except Exception as e:
-        os.remove(filepath)
         return f"Transcription failed: {str(e)}", 500
+    finally:
+        audio_file.close()
 
-    # Reuse your summarizer and insight logic
-    summary = summarizer(
-        transcript,
-        max_length=150,
-        min_length=30,
-        do_sample=False
-    )
-    summary_text = summary[0]['summary_text']
-
-    insights = extract_insights(transcript)
+    transcribe_seconds = time.perf_counter() - started
 
-    return render_template(
-        "index.html",
-        summary=f"<strong>Summary of your therapy session:</strong> {summary_text}",
-        concerns=insights["concerns"],
-        breakthroughs=insights["breakthroughs"]
-    )
+    # Reuse your summarizer and insight logic
+    return render_analysis(analyze_session(transcript, "audio", transcribe_seconds, request_budget()))
 
 
 @app.route("/summarize_text", methods=["POST"])
+@traced
 def summarize_text():
     transcript = request.form["text"]
 
-    # Generate summary
-    summary = summarizer(
-        transcript,
-        max_length=150,
-        min_length=30,
-        do_sample=False
-    )
-    summary_text = summary[0]['summary_text']
+    return render_analysis(analyze_session(transcript, "text", budget_seconds=request_budget()))
 
-    # Extract insights
-    insights = extract_insights(transcript)
+@app.route("/summarize_stream", methods=["POST"])
+def summarize_stream():
+    # Same analysis as /summarize_text and /transcribe_audio, reported as
+    # Server-Sent Events while it runs: transcribed, tier, progress, token,
+    # summary, concerns, breakthroughs, then done (or error)
+    audio_file = request.files.get("audio")
+    text = request.form.get("text")
+    if not audio_file and not text:
+        return "Provide text or an audio file", 400
+    budget_seconds = request_budget()
+    events = queue.Queue()
 
-    return render_template(
-        "index.html",
-        summary=f"<strong>Summary of your therapy session:</strong> {summary_text}",
-        concerns=insights["concerns"],
-        breakthroughs=insights["breakthroughs"]
+    def emit(event, data):
+        events.put((event, data))
+
+    def run():
+        # The trace is recorded before the stream closes
+        try:
+            with tracer.trace("summarize_stream", method="POST", path="/summarize_stream") as root:
+                analyze_stream(root)
+        finally:
+            events.put(None)
+
+    def analyze_stream(root):
+        try:
+            transcript, transcribe_seconds = text, None
+            if audio_file:
+                started = time.perf_counter()
+                try:
+                    transcript = transcribe(
+                        audio_file.stream,
+                        secure_filename(audio_file.filename or "") or "audio.wav",
+                        audio_file.mimetype
+                    )
+                finally:
+                    audio_file.close()
+                transcribe_seconds = time.perf_counter() - started
+                emit("transcribed", {"seconds": transcribe_seconds, "words": len(transcript.split())})
+
+            analysis = analyze_session(
+                transcript,
+                "audio" if audio_file else "text",
+                transcribe_seconds,
+                budget_seconds,
+                emit=emit
+            )
+            emit("done", {**analysis, "trace_id": root.trace_id} if root else analysis)
+        except Exception as e:
+            emit("error", {"error": str(e)})
+
+    # The analysis runs on its own thread so events reach the client while
+    # it is still going; the request context (and the upload) stays open
+    # until the stream ends
+    threading.Thread(target=run, name="summarize-stream", daemon=True).start()
+
+    def stream():
+        while True:
+            item = events.get()
+            if item is None:
+                return
+            event, data = item
+            if event == "done":
+                data = {**data, "url": url_for('view_session', session_id=data["session_id"])}
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 @app.route("/dashboard", methods=["GET"])
 def dashboard():
-    # Get all sessions from database
-    conn = sqlite3.connect('database/therapy_sessions.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, date, summary FROM sessions ORDER BY date DESC LIMIT 1024")
-    sessions = cursor.fetchall()
-    conn.close()
+    # Keyset pagination: each page starts strictly after the (date, id) of
+    # the previous page's last row, so every page is an index range scan
+    size = min(max(request.args.get("size", DASHBOARD_PAGE_SIZE, type=int), 1), DASHBOARD_MAX_PAGE_SIZE)
+    cursor = request.args.get("cursor")
+
+    if cursor:
+        before_date, _, before_id = cursor.rpartition("|")
+        if not before_date or not before_id.isdigit():
+            return "Invalid cursor", 400
+        sessions = db.fetchall(
+            '''SELECT id, date, summary_preview FROM sessions
+               WHERE (date, id) < (?, ?)
+               ORDER BY date DESC, id DESC LIMIT ?''',
+            (before_date, int(before_id), size + 1)
+        )
+    else:
+        sessions = db.fetchall(
+            "SELECT id, date, summary_preview FROM sessions ORDER BY date DESC, id DESC LIMIT ?",
+            (size + 1,)
+        )
+
+    next_cursor = None
+    if len(sessions) > size:
+        sessions = sessions[:size]
+        next_cursor = f"{sessions[-1][1]}|{sessions[-1][0]}"
     
-    return render_template("dashboard.html", sessions=sessions)
+    return render_template("dashboard.html", sessions=sessions, size=size, next_cursor=next_cursor, paged=bool(cursor))
+
+def fts_query(text):
+    # Quote every term so user input can't trip FTS5 query syntax; a
+    # trailing * keeps prefix search
+    terms = []
+    for term in re.findall(r"[\w']+\*?", text):
+        word = term.rstrip("*").replace('"', '""')
+        terms.append(f'"{word}"*' if term.endswith("*") else f'"{word}"')
+    return " ".join(terms)
+
+def highlight(snippet):
+    return Markup(escape(snippet).replace(SNIPPET_OPEN, Markup("<mark>")).replace(SNIPPET_CLOSE, Markup("</mark>")))
+
+@app.route("/search", methods=["GET"])
+def search():
+    text = request.args.get("q", "").strip()
+    page = max(request.args.get("page", 1, type=int), 1)
+    size = min(max(request.args.get("size", SEARCH_PAGE_SIZE, type=int), 1), DASHBOARD_MAX_PAGE_SIZE)
+    query = fts_query(text)
+
+    results = []
+    if query:
+        rows = db.fetchall(
+            '''SELECT sessions.id, sessions.date, snippet(sessions_fts, -1, ?, ?, '…', 16)
+               FROM sessions_fts JOIN sessions ON sessions.id = sessions_fts.rowid
+               WHERE sessions_fts MATCH ?
+               ORDER BY rank LIMIT ? OFFSET ?''',
+            (SNIPPET_OPEN, SNIPPET_CLOSE, query, size + 1, (page - 1) * size)
+        )
+        results = [(session_id, date, highlight(snippet)) for session_id, date, snippet in rows[:size]]
+        has_next = len(rows) > size
+    else:
+        has_next = False
+
+    return render_template("search.html", q=text, results=results, page=page, size=size, has_next=has_next)
+
+@app.cli.command("rebuild-search-index")
+def rebuild_search_index_command():
+    """Rebuild the full-text search index from the sessions table."""
+    rebuild_search_index()
+    click.echo("Search index rebuilt.")
 
 @app.route("/view_session/<int:session_id>", methods=["GET"])
 def view_session(session_id):
     # Get specific session from database
-    conn = sqlite3.connect('database/therapy_sessions.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, date, transcript, summary FROM sessions WHERE id = ?", (session_id,))
-    session = cursor.fetchone()
-    conn.close()
+    session = db.fetchone("SELECT id, date, transcript, summary FROM sessions WHERE id = ?", (session_id,))
     
     if not session:
         return redirect(url_for('dashboard'))
+
+    concerns, breakthroughs = load_insights(session_id)
     
-    return render_template("view_session.html", session=session)
+    return render_template(
+        "view_session.html",
+        session=session,
+        concerns=concerns,
+        breakthroughs=breakthroughs,
+        similar=similar_sessions(session_id)
+    )
+
+@app.route("/similar/<int:session_id>", methods=["GET"])
+def similar(session_id):
+    if not db.fetchone("SELECT 1 FROM sessions WHERE id = ?", (session_id,)):
+        return jsonify(error="Unknown session"), 404
+    k = min(max(request.args.get("k", SIMILAR_SESSIONS, type=int), 1), SIMILAR_MAX_SESSIONS)
+    return jsonify(
+        session_id=session_id,
+        similar=[
+            {"id": row[0], "date": row[1], "preview": row[2], "score": round(row[3], 4)}
+            for row in similar_sessions(session_id, k)
+        ]
+    )
+
+@app.cli.command("check-engines")
+@click.option("--summarizer-engine", default=SUMMARIZER_ENGINE, show_default=True)
+@click.option("--classifier-engine", default=CLASSIFIER_ENGINE, show_default=True)
+@click.option("--limit", default=20, show_default=True, help="Stored sessions to compare on.")
+@click.option("--min-rouge", default=0.8, show_default=True)
+@click.option("--max-score-delta", default=0.05, show_default=True)
+@click.option("--tier", "tier_name", type=click.Choice([tier.name for tier in TIERS]), default=TIERS[0].name, show_default=True)
+def check_engines_command(summarizer_engine, classifier_engine, limit, min_rouge, max_score_delta, tier_name):
+    """Compare an engine's summaries and concern scores against FP32."""
+    tier = router.tier(tier_name)
+    transcripts = [row[0] for row in db.fetchall("SELECT transcript FROM sessions ORDER BY id DESC LIMIT ?", (limit,))]
+
+    def analyzer(summarizer_engine, classifier_engine):
+        summarizer = load_pipeline("summarization", tier.summarizer_model, tier.summarizer_revision, summarizer_engine)
+        classifier = load_pipeline("zero-shot-classification", tier.classifier_model, tier.classifier_revision, classifier_engine)
+        scorer = ConcernScorer(classifier.model, classifier.tokenizer)
+
+        def analyze(text):
+            scores = scorer.score(text)
+            return summarize_transcript(summarizer, text), dict(zip(scores["labels"], scores["scores"]))
+        return analyze
+
+    report = accuracy_report(
+        transcripts,
+        analyzer("torch", "torch"),
+        analyzer(summarizer_engine, classifier_engine),
+        CONCERN_THRESHOLD,
+        min_rouge=min_rouge,
+        max_score_delta=max_score_delta
+    )
+    report.update(tier=tier.name, summarizer_engine=summarizer_engine, classifier_engine=classifier_engine)
+    click.echo(json.dumps(report, indent=2))
+    sys.exit(0 if report["passed"] else 1)
+
+@app.cli.command("embed-sessions")
+def embed_sessions_command():
+    """Embed every stored session that is missing from the similarity index."""
+    embedder = models.get("embedder")
+    count = 0
+    for session_id, transcript in db.fetchall("SELECT id, transcript FROM sessions ORDER BY id"):
+        if embedding_index.get(session_id) is None:
+            embedding_index.add(session_id, embedder.embed(transcript))
+            count += 1
+    click.echo(f"Embedded {count} sessions.")
+
+# Concurrent re-summarize clicks on the same session share one computation
+resummarize_flight = SingleFlight()
+
+def resummarize_session(session_id):
+    return resummarize_flight.do(session_id, lambda: resummarize_stored(session_id))
+
+def resummarize_stored(session_id, attempts=3):
+    for _ in range(attempts):
+        # Read phase: grab the transcript and the row version, hold nothing open
+        session = db.fetchone("SELECT transcript, version FROM sessions WHERE id = ?", (session_id,))
+        
+        if not session:
+            return None
+        
+        transcript, version = session
+        
+        # Inference phase: no database handle is involved while the model runs
+        tier = router.choose(len(transcript.split()))
+        with router.track():
+            summary_text = summarize(transcript, tier)
+        
+        # Write phase: a short compare-and-set on the version read above
+        updated = db.execute(
+            '''UPDATE sessions SET summary = ?, summarizer_model = ?, summarizer_tier = ?, version = version + 1
+               WHERE id = ? AND version = ?''',
+            (summary_text, summarizer_version(tier), tier.name, session_id, version)
+        ).rowcount
+        if updated:
+            return summary_text
+
+        # Someone else wrote in between; start over from their version
+
+    raise RuntimeError(f"Session {session_id} kept changing while it was being re-summarized")
 
 @app.route("/re_summarize/<int:session_id>", methods=["POST"])
+@traced
 def re_summarize(session_id):
-    # Get transcript from database
-    conn = sqlite3.connect('database/therapy_sessions.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT transcript FROM sessions WHERE id = ?", (session_id,))
-    session = cursor.fetchone()
-    
-    if not session:
-        conn.close()
+    if resummarize_session(session_id) is None:
         return redirect(url_for('dashboard'))
     
-    transcript = session[0]
-    
-    # Generate new summary
-    summary = summarizer(
-        transcript,
-        max_length=150,
-        min_length=30,
-        do_sample=False
-    )
-    
-    summary_text = summary[0]['summary_text']
-    
-    # Update the database with new summary
-    cursor.execute(
-        "UPDATE sessions SET summary = ? WHERE id = ?",
-        (summary_text, session_id)
-    )
-    conn.commit()
-    conn.close()
-    
     return redirect(url_for('view_session', session_id=session_id))
 
+# Background analysis jobs: submit returns a job id at once and the work
+# runs on a bounded worker pool instead of the request thread
+jobs = JobQueue(
+    db,
+    workers=int(os.getenv("JOB_WORKERS", "2")),
+    max_queued=int(os.getenv("JOB_MAX_QUEUED", "100"))
+)
+
+UPLOAD_DIR = os.path.join('database', 'uploads')
+
+@jobs.handler("analyze_text")
+def analyze_text_job(text):
+    return analyze_session(text, "text")
+
+@jobs.handler("analyze_audio")
+def analyze_audio_job(path):
+    started = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            transcript = transcribe(f, os.path.basename(path))
+    finally:
+        os.remove(path)
+    transcribe_seconds = time.perf_counter() - started
+    return {"transcript": transcript, **analyze_session(transcript, "audio", transcribe_seconds)}
+
+@jobs.handler("re_summarize")
+def re_summarize_job(session_id):
+    summary_text = resummarize_session(session_id)
+    if summary_text is None:
+        raise LookupError(f"Session {session_id} not found")
+    return {"session_id": session_id, "summary": summary_text}
+
+@app.before_request
+def start_job_workers():
+    jobs.start()
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    audio_file = request.files.get("audio")
+    try:
+        if audio_file:
+            # Each job gets its own upload file so queued audio survives restarts
+            os.makedirs(UPLOAD_DIR, exist_ok=True)
+            extension = os.path.splitext(secure_filename(audio_file.filename or ""))[1] or ".wav"
+            path = os.path.join(UPLOAD_DIR, uuid.uuid4().hex + extension)
+            audio_file.save(path)
+            try:
+                job_id = jobs.submit("analyze_audio", {"path": path})
+            except QueueFull:
+                os.remove(path)
+                raise
+        elif request.form.get("text"):
+            job_id = jobs.submit("analyze_text", {"text": request.form["text"]})
+        elif request.form.get("session_id", type=int) is not None:
+            job_id = jobs.submit("re_summarize", {"session_id": request.form.get("session_id", type=int)})
+        else:
+            return jsonify(error="Provide text, audio or session_id"), 400
+    except QueueFull as e:
+        response = jsonify(error=f"Analysis queue is full: {e}")
+        response.headers["Retry-After"] = "30"
+        return response, 503
+
+    return jsonify(id=job_id, status="queued", url=url_for('job_status', job_id=job_id)), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify(error="Job not found"), 404
+    return jsonify(job)
+
+# A comment line this often lets a write fail once the client has gone;
+# past the lifetime cap the stream ends and the client reconnects or polls
+JOB_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("JOB_EVENTS_KEEPALIVE_SECONDS", "15"))
+JOB_EVENTS_MAX_SECONDS = float(os.getenv("JOB_EVENTS_MAX_SECONDS", "600"))
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    if not jobs.get(job_id):
+        return jsonify(error="Job not found"), 404
+
+    def stream():
+        # Server-Sent Events: one event per status change until the job ends,
+        # or a final "timeout" event if it outlives JOB_EVENTS_MAX_SECONDS
+        started = last_write = time.monotonic()
+        last_status = None
+        while True:
+            job = jobs.get(job_id)
+            now = time.monotonic()
+            if job["status"] != last_status:
+                last_status = job["status"]
+                last_write = now
+                yield f"event: {last_status}\ndata: {json.dumps(job)}\n\n"
+            if last_status in ("done", "failed"):
+                return
+            if now - started >= JOB_EVENTS_MAX_SECONDS:
+                yield f"event: timeout\ndata: {json.dumps(job)}\n\n"
+                return
+            if now - last_write >= JOB_EVENTS_KEEPALIVE_SECONDS:
+                last_write = now
+                yield ": keepalive\n\n"
+            time.sleep(0.5)
+
+    return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# Scrape-time gauges and counters, read straight from the components that
+# already keep the numbers
+def model_memory():
+    samples = []
+    for name, model in models.loaded().items():
+        module = getattr(model, "model", None)
+        if hasattr(module, "parameters"):
+            tensors = list(module.parameters()) + list(module.buffers())
+            samples.append(({"model": name}, sum(t.numel() * t.element_size() for t in tensors)))
+    return samples
+
+def resident_memory():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def batch_pending():
+    return [
+        ({"batcher": name}, model.pending())
+        for name, model in models.loaded().items()
+        if hasattr(model, "pending")
+    ]
+
+def job_counts():
+    counts = dict(db.fetchall("SELECT status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY status"))
+    return [({"status": status}, counts.get(status, 0)) for status in ("queued", "running")]
+
+metrics.counter("therapai_cache_hits_total", "Result cache hits.", collect=lambda: cache.hits)
+metrics.counter("therapai_cache_misses_total", "Result cache misses.", collect=lambda: cache.misses)
+metrics.gauge("therapai_jobs", "Background jobs by status.", ["status"], collect=job_counts)
+metrics.gauge("therapai_analyses_in_flight", "Analyses currently running in this process.", collect=lambda: router.active)
+metrics.gauge("therapai_batch_pending", "Items waiting in each micro-batcher.", ["batcher"], collect=batch_pending)
+metrics.gauge("therapai_model_memory_bytes", "Parameter and buffer memory of each loaded model.", ["model"], collect=model_memory)
+metrics.gauge("therapai_process_resident_memory_bytes", "Resident set size of this process.", collect=resident_memory)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    # Streaming responses are timed up to their first byte
+    if "request_started" in g:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - g.request_started,
+            endpoint=request.endpoint or "unmatched",
+            method=request.method,
+            status=response.status_code
+        )
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    if not metrics.enabled:
+        return "Metrics are disabled", 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# Trace and profile pages need DEBUG_TOKEN as the HTTP Basic password (any
+# user name). Without it they don't exist. Behind a reverse proxy the peer
+# address says nothing about the client, so it is not checked.
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+DEBUG_TRACES = 50
+
+def debug_denied():
+    # None when the request may see debug pages, else the response to send
+    if not DEBUG_TOKEN:
+        return "Not found", 404
+    auth = request.authorization
+    if auth is not None and hmac.compare_digest(auth.password or "", DEBUG_TOKEN):
+        return None
+    return Response("Authentication required", 401, {"WWW-Authenticate": 'Basic realm="TherapAI debug"'})
+
+def span_rows(span, total_ms, depth=0, rows=None):
+    # Depth-first span list with waterfall offsets as percentages of the trace
+    rows = [] if rows is None else rows
+    rows.append({
+        **span,
+        "depth": depth,
+        "left": 100 * span["offset_ms"] / total_ms if total_ms else 0,
+        "width": max(100 * span["duration_ms"] / total_ms, 0.2) if total_ms else 100
+    })
+    for child in span["children"]:
+        span_rows(child, total_ms, depth + 1, rows)
+    return rows
+
+@app.route("/debug/traces", methods=["GET"])
+def debug_traces():
+    denied = debug_denied()
+    if denied:
+        return denied
+    traces = [
+        {**trace, "started": datetime.fromtimestamp(trace["started_at"]).strftime("%Y-%m-%d %H:%M:%S")}
+        for trace in tracer.slowest(request.args.get("limit", DEBUG_TRACES, type=int))
+    ]
+    return render_template("traces.html", traces=traces, enabled=tracer.enabled)
+
+@app.route("/debug/traces/<trace_id>", methods=["GET"])
+def debug_trace(trace_id):
+    denied = debug_denied()
+    if denied:
+        return denied
+    trace = tracer.get(trace_id)
+    if trace is None:
+        return "Not found", 404
+    if request.args.get("format") == "json":
+        return jsonify(trace)
+    return render_template("traces.html", trace=trace, spans=span_rows(trace["root"], trace["duration_ms"]))
+
+@app.route("/debug/profiles/<trace_id>/<kind>", methods=["GET"])
+def debug_profile(trace_id, kind):
+    denied = debug_denied()
+    if denied:
+        return denied
+    if kind not in ("collapsed", "ops.txt"):
+        return "Not found", 404
+    return send_from_directory(os.path.abspath(PROFILE_DIR), f"{trace_id}.{kind}", mimetype="text/plain")
+
+def fork_safe_models():
+    # PyTorch pipelines start no threads while loading. ONNX Runtime
+    # sessions and the local Whisper (CTranslate2) transcriber build thread
+    # pools at load time, which would be missing in forked workers.
+    names = ["embedder"]
+    for tier in TIERS:
+        if SUMMARIZER_ENGINE != "onnx":
+            names += [f"summarizer:{tier.name}", f"summary_batcher:{tier.name}"]
+        if CLASSIFIER_ENGINE != "onnx":
+            names += [f"classifier:{tier.name}", f"concern_scorer:{tier.name}", f"concern_batcher:{tier.name}"]
+    return names
+
+def set_torch_threads(count):
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(count)
+
+@app.cli.command("serve")
+@click.option("--bind", default=os.getenv("SERVE_BIND", "127.0.0.1:8000"), show_default=True)
+@click.option("--workers", type=int, default=int(os.getenv("SERVE_WORKERS", "0")), help="Worker processes. [default: one per 4 cores]")
+@click.option("--threads", type=int, default=int(os.getenv("SERVE_THREADS", "8")), show_default=True, help="Request threads per worker.")
+@click.option("--torch-threads", type=int, default=int(os.getenv("SERVE_TORCH_THREADS", "0")), help="Inference threads per worker. [default: cores / workers]")
+def serve_command(bind, workers, threads, torch_threads):
+    """Serve with gunicorn; models load once and forked workers share them."""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise RuntimeError("The serve command needs gunicorn: pip install gunicorn")
+
+    cores = os.cpu_count() or 1
+    workers = workers or max(1, cores // 4)
+    # Workers times inference threads stays within the cores
+    torch_threads = torch_threads or max(1, cores // workers)
+
+    # Load the PyTorch models in this process before forking. Workers
+    # inherit the weights copy-on-write, and inference never writes to
+    # them, so the pages stay shared. Nothing here may start a thread pool,
+    # which would not survive the fork; the transcriber and any onnx models
+    # load in each worker instead.
+    set_torch_threads(1)
+    preload = fork_safe_models()
+    models.load_all(preload)
+    for name, status in models.status().items():
+        if name in preload and status["state"] == "failed":
+            click.echo(f"{name} failed to load, workers will retry: {status['error']}", err=True)
+    # Jobs from processes that are gone go back in the queue before forking
+    jobs.requeue()
+    # Keep the collector from touching, and so copying, the preloaded objects
+    gc.freeze()
+
+    def post_fork(server, worker):
+        set_torch_threads(torch_threads)
+        models.start_background()
+        jobs.start(requeue=False)
+
+    def child_exit(server, worker):
+        jobs.requeue(worker.pid)
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in {
+                "bind": bind,
+                "workers": workers,
+                "threads": threads,
+                "worker_class": "gthread",
+                "preload_app": True,
+                "post_fork": post_fork,
+                "child_exit": child_exit,
+            }.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    click.echo(f"Serving on {bind} with {workers} workers x {threads} threads, {torch_threads} torch threads each")
+    Server().run()
+
 if __name__ == "__main__":
+    # The debug reloader re-runs this file in a child process; only that one serves
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        models.start_background()
+        jobs.start()
     app.run(debug=True)
 # app.py
@@ -0,0 +1,142 @@
+from collections import deque
+from concurrent.futures import Future
+import threading
+import time
+
+
+class MicroBatcher:
+    # Collects items submitted from many request threads and runs them
+    # through run_batch together on a single scheduler thread.
+    #
+    # A lone request under light traffic is dispatched immediately; the
+    # gathering window only opens when submissions are arriving closer
+    # together than max_wait_ms.
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=30, name="micro-batcher"):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self._pending = deque()
+        self._ready = threading.Condition()
+        self._thread = None
+        self._last_arrival = 0.0
+        self._last_gap = float("inf")
+
+    def enqueue_many(self, items):
+        # Futures for items' results, without waiting on them
+        futures = [Future() for _ in items]
+        with self._ready:
+            now = time.monotonic()
+            self._last_gap = now - self._last_arrival
+            self._last_arrival = now
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+            # Enqueue all of a caller's items at once so they are never split
+            # across batches by a scheduler that wakes up mid-submission
+            self._pending.extend(zip(items, futures))
+            self._ready.notify()
+        return futures
+
+    def submit_many(self, items):
+        return [future.result() for future in self.enqueue_many(items)]
+
+    def submit(self, item):
+        return self.submit_many([item])[0]
+
+    def pending(self):
+        return len(self._pending)
+
+    def _collect(self):
+        with self._ready:
+            self._ready.wait_for(lambda: self._pending)
+            if self._last_gap < self.max_wait:
+                self._ready.wait_for(lambda: len(self._pending) >= self.max_batch_size, timeout=self.max_wait)
+            size = min(len(self._pending), self.max_batch_size)
+            return [self._pending.popleft() for _ in range(size)]
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            futures = [future for _, future in batch]
+            try:
+                results = list(self.run_batch([item for item, _ in batch]))
+                if len(results) != len(batch):
+                    # A short result list would leave some callers waiting forever
+                    raise RuntimeError(f"{self.name}: run_batch returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+
+
+class BatchedPipeline:
+    # Drop-in front end for a transformers pipeline: concurrent calls with
+    # the same generation arguments are merged into shared padded batches
+
+    def __init__(self, pipeline, max_batch_size=8, max_wait_ms=30):
+        self.pipeline = pipeline
+        self.tokenizer = pipeline.tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._batchers = {}
+        self._lock = threading.Lock()
+
+    def _batcher(self, kwargs):
+        key = tuple(sorted(kwargs.items()))
+        with self._lock:
+            if key not in self._batchers:
+                self._batchers[key] = MicroBatcher(
+                    lambda texts: self.pipeline(texts, batch_size=len(texts), **kwargs),
+                    max_batch_size=self.max_batch_size,
+                    max_wait_ms=self.max_wait_ms,
+                    name=f"{self.pipeline.task}-batcher"
+                )
+            return self._batchers[key]
+
+    def enqueue(self, inputs, batch_size=None, **kwargs):
+        # batch_size is decided by the scheduler, not the caller
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        return self._batcher(kwargs).enqueue_many(texts)
+
+    def __call__(self, inputs, batch_size=None, **kwargs):
+        return [future.result() for future in self.enqueue(inputs, batch_size, **kwargs)]
+
+    def pending(self):
+        with self._lock:
+            batchers = list(self._batchers.values())
+        return sum(batcher.pending() for batcher in batchers)
+
+
+class SingleFlight:
+    # Coalesces concurrent calls with the same key: the first caller runs
+    # the work, later callers wait for and share its result
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
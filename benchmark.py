@@ -0,0 +1,296 @@
+# Benchmarks the analysis pipeline on reproducible synthetic inputs:
+#
+#   python benchmark.py --iterations 20 --output bench.json
+#   python benchmark.py --stages transcribe,breakthroughs,db_write,render --compare bench.json
+#
+# Each stage runs on every corpus and the report gives p50/p95/p99 latency,
+# throughput and peak RSS as JSON. With --compare the exit status is 1 when
+# a stage's p95 regressed by more than --tolerance against an earlier report.
+import argparse
+import array
+import io
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+STAGES = ("transcribe", "summarize", "classify", "breakthroughs", "db_write", "render")
+
+# Words per transcript; "long" is well past 10k BART tokens
+CORPORA = {
+    "short": {"words": 150, "breakthrough_rate": 0.05},
+    "medium": {"words": 1500, "breakthrough_rate": 0.05},
+    "long": {"words": 9000, "breakthrough_rate": 0.05},
+    "dense": {"words": 1500, "breakthrough_rate": 0.6},
+}
+
+# Seconds of stub audio; "long" is split into several transcription segments
+AUDIO = {
+    "short": 60,
+    "long": 1200,
+}
+
+TOPICS = ["work", "my mother", "my partner", "sleep", "money", "my friends", "the new job", "school"]
+FEELINGS = ["anxious", "tired", "overwhelmed", "hopeful", "angry", "lonely", "calm", "stuck"]
+CLIENT_SENTENCES = [
+    "I have been feeling {feeling} about {topic} lately.",
+    "Every time I think about {topic} I get {feeling}.",
+    "Honestly {topic} takes up most of my week.",
+    "I don't know why {topic} makes me so {feeling}.",
+    "Last night I couldn't stop thinking about {topic}.",
+]
+THERAPIST_SENTENCES = [
+    "What comes up for you when you think about {topic}?",
+    "It sounds like {topic} has been weighing on you.",
+    "How long have you felt {feeling} like this?",
+    "What would it look like if {topic} felt easier?",
+]
+BREAKTHROUGH_SENTENCES = [
+    "I realized that {topic} is not really the problem.",
+    "Now I see why I get {feeling} around {topic}.",
+    "It became clear that I avoid {topic} when I'm {feeling}.",
+    "I learned that I can ask for help with {topic}.",
+]
+
+
+def synthetic_transcript(rng, words, breakthrough_rate):
+    # Alternating therapist / client turns of a few sentences each
+    lines, count = [], 0
+    speakers = ["Therapist", "Client"]
+    turn = 0
+    while count < words:
+        speaker = speakers[turn % 2]
+        sentences = []
+        for _ in range(rng.randint(1, 4)):
+            if speaker == "Client":
+                pool = BREAKTHROUGH_SENTENCES if rng.random() < breakthrough_rate else CLIENT_SENTENCES
+            else:
+                pool = THERAPIST_SENTENCES
+            sentences.append(rng.choice(pool).format(topic=rng.choice(TOPICS), feeling=rng.choice(FEELINGS)))
+        line = f"{speaker}: {' '.join(sentences)}"
+        lines.append(line)
+        count += len(line.split())
+        turn += 1
+    return "\n".join(lines)
+
+
+def synthetic_wav(rng, seconds, rate=16000):
+    # Bursts of tone separated by short silences, so segment cuts have
+    # pauses to snap to. Whole-hertz pitches make a one-second tone loop
+    # seamlessly.
+    tones = [
+        array.array("h", (int(8000 * math.sin(2 * math.pi * pitch * i / rate)) for i in range(rate)))
+        for pitch in (140, 190, 230, 280)
+    ]
+    samples = array.array("h")
+    while len(samples) < seconds * rate:
+        tone = rng.choice(tones)
+        burst = int(rate * rng.uniform(1.0, 6.0))
+        samples.extend((tone * (burst // rate + 1))[:burst])
+        samples.extend(array.array("h", bytes(2 * int(rate * rng.uniform(0.2, 0.8)))))
+    del samples[seconds * rate:]
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(rate)
+        writer.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None  # Not available on Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize_timings(seconds, items):
+    ordered = sorted(seconds)
+    total = sum(ordered)
+    return {
+        "runs": len(ordered),
+        "mean_ms": round(1000 * total / len(ordered), 3),
+        "p50_ms": round(1000 * percentile(ordered, 50), 3),
+        "p95_ms": round(1000 * percentile(ordered, 95), 3),
+        "p99_ms": round(1000 * percentile(ordered, 99), 3),
+        "throughput_per_s": round(items / total, 3) if total else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(stages, iterations, warmup, seed, tier_name):
+    rng = random.Random(seed)
+    # Every run gets its own transcript so nothing is served from a cache
+    corpora = {
+        name: [synthetic_transcript(rng, spec["words"], spec["breakthrough_rate"]) for _ in range(warmup + iterations)]
+        for name, spec in CORPORA.items()
+    }
+    audio = {name: synthetic_wav(rng, seconds) for name, seconds in AUDIO.items()}
+
+    # The app keeps its databases under ./database; point it at a scratch
+    # directory so benchmark rows never reach the real ones
+    workdir = tempfile.mkdtemp(prefix="therapai-bench-")
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+    from transcription import ChunkedTranscriber, StubTranscriber
+    from summarization import summarize_transcript
+    from breakthroughs import find_breakthroughs
+    from sentences import SentenceIndex
+
+    tier = app.router.tier(tier_name)
+    transcriber = ChunkedTranscriber(StubTranscriber())
+
+    def analysis_for(text):
+        # Stand-in analysis for the storage and rendering stages
+        return {
+            "tier": tier.name,
+            "summary": text[:600],
+            "concerns": ["anxiety"],
+            "concern_scores": {"anxiety": 0.8},
+            "breakthroughs": find_breakthroughs(text),
+            "timings": {"summarize_seconds": 0.0, "insights_seconds": 0.0},
+        }
+
+    analyses = {}
+    if {"db_write", "render"} & set(stages):
+        analyses = {text: analysis_for(text) for texts in corpora.values() for text in texts}
+
+    def render(text):
+        with app.app.test_request_context():
+            app.render_analysis({**analyses[text], "session_id": 1})
+
+    stage_work = {
+        "summarize": lambda text: summarize_transcript(app.models.get(f"summary_batcher:{tier.name}"), text),
+        "classify": lambda text: app.models.get(f"concern_scorer:{tier.name}").score(text),
+        "breakthroughs": lambda text: find_breakthroughs(text, index=SentenceIndex(text)),
+        "db_write": lambda text: app.save_session(text, analyses[text], "benchmark"),
+        "render": render,
+    }
+
+    results = {}
+    for stage in stages:
+        results[stage] = {}
+        if stage == "transcribe":
+            for name, wav in audio.items():
+                timings = []
+                for i in range(warmup + iterations):
+                    started = time.perf_counter()
+                    transcriber(io.BytesIO(wav), f"{name}.wav", "audio/wav")
+                    if i >= warmup:
+                        timings.append(time.perf_counter() - started)
+                results[stage][name] = summarize_timings(timings, len(timings))
+                results[stage][name]["audio_seconds"] = AUDIO[name]
+            continue
+
+        for name, texts in corpora.items():
+            timings = []
+            for i, text in enumerate(texts):
+                started = time.perf_counter()
+                stage_work[stage](text)
+                if i >= warmup:
+                    timings.append(time.perf_counter() - started)
+            results[stage][name] = summarize_timings(timings, len(timings))
+            results[stage][name]["words"] = CORPORA[name]["words"]
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "seed": seed,
+            "iterations": iterations,
+            "warmup": warmup,
+            "tier": tier.name,
+            "summarizer_engine": app.SUMMARIZER_ENGINE,
+            "classifier_engine": app.CLASSIFIER_ENGINE,
+        },
+        "stages": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(report, baseline, tolerance):
+    # Stage/corpus pairs whose p95 grew by more than tolerance
+    regressions = []
+    for stage, corpora in report["stages"].items():
+        for name, current in corpora.items():
+            previous = baseline.get("stages", {}).get(stage, {}).get(name)
+            if previous and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+                regressions.append({
+                    "stage": stage,
+                    "corpus": name,
+                    "baseline_p95_ms": previous["p95_ms"],
+                    "p95_ms": current["p95_ms"],
+                    "change": round(current["p95_ms"] / previous["p95_ms"] - 1, 3),
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the TherapAI analysis pipeline.")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {', '.join(STAGES)}")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs per corpus, e.g. for model loading")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--tier", default="full", help="Model tier for summarize and classify")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--compare", help="Earlier report to check for p95 regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed p95 growth, as a fraction")
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    # Paths given on the command line are relative to where we were started
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    report = run(stages, args.iterations, args.warmup, args.seed, args.tier)
+    if baseline_path:
+        with open(baseline_path) as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    sys.exit(1 if report.get("regressions") else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import re
+
+from sentences import SentenceIndex
+
+# Key phrases that signal a realization, compiled once into a single
+# alternation so the transcript is scanned in one pass
+BREAKTHROUGH_PATTERN = re.compile(
+    r"(?:I\s+)?(?:realized|understood|discovered|learned)"
+    r"|now\s+I\s+(?:see|understand|know)"
+    r"|it\s+(?:becomes|became)\s+clear",
+    re.IGNORECASE
+)
+
+# Characters of context to take on each side of a match before snapping to sentences
+CONTEXT_CHARS = 150
+
+MAX_BREAKTHROUGHS = 3
+
+
+def find_breakthroughs(text, limit=MAX_BREAKTHROUGHS, index=None):
+    # Breakthrough excerpts in document order, never overlapping each other
+    if index is None:
+        index = SentenceIndex(text)
+    breakthroughs = []
+    seen = set()
+    covered = 0
+    for match in BREAKTHROUGH_PATTERN.finditer(text):
+        if match.start() < covered:
+            continue  # Already inside the previous excerpt
+
+        start, end = index.boundaries(
+            max(0, match.start() - CONTEXT_CHARS),
+            min(len(text), match.end() + CONTEXT_CHARS)
+        )
+        start = max(start, covered)
+        covered = end
+
+        breakthrough_text = text[start:end].strip()
+        if len(breakthrough_text) > 10 and breakthrough_text not in seen:  # Ensure we have meaningful content
+            seen.add(breakthrough_text)
+            breakthroughs.append(breakthrough_text)
+            if len(breakthroughs) == limit:
+                break
+
+    return breakthroughs
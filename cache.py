@@ -0,0 +1,104 @@
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+import time
+
+
+def normalize_transcript(text):
+    # Whitespace-only edits shouldn't miss the cache
+    return " ".join(text.split())
+
+
+def cache_key(namespace, text, params):
+    # Content address: the normalized transcript plus everything that can
+    # change the output (model name, revision, generation parameters)
+    header = json.dumps({"namespace": namespace, "params": params}, sort_keys=True, default=str)
+    digest = hashlib.sha256(header.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_transcript(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    # Two tiers: an in-process LRU in front of a size-bounded SQLite table
+
+    def __init__(self, db, memory_entries=512, max_bytes=256 * 1024 * 1024):
+        self.db = db
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.db.execute('''
+        CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_used REAL NOT NULL
+        )
+        ''')
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_results_last_used ON results(last_used)")
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        row = self.db.fetchone("SELECT value FROM results WHERE key = ?", (key,))
+        if row:
+            self.db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+
+        if not row:
+            self.misses += 1
+            return None
+        self.hits += 1
+        value = json.loads(row[0])
+        self._remember(key, value)
+        return value
+
+    def set(self, key, value):
+        self._remember(key, value)
+        payload = json.dumps(value)
+
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time())
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        # Drop least recently used rows until the table fits in max_bytes
+        total = conn.execute("SELECT total(size) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        while excess > 0:
+            oldest = conn.execute("SELECT key, size FROM results ORDER BY last_used LIMIT 64").fetchall()
+            if not oldest:
+                break
+            for key, size in oldest:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                excess -= size
+                if excess <= 0:
+                    break
+
+    def get_or_compute(self, namespace, text, params, compute):
+        key = cache_key(namespace, text, params)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
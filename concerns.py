@@ -0,0 +1,75 @@
+import time
+
+CONCERN_LABELS = ["anxiety", "depression", "relationships", "work stress", "family issues", "self-esteem"]
+
+# Same template the zero-shot-classification pipeline uses by default
+HYPOTHESIS_TEMPLATE = "This example is {}."
+
+
+class ConcernScorer:
+    # Multi-label zero-shot scoring with one tokenization of the transcript
+    # and all label hypotheses evaluated together in padded batches.
+    # observe_batch(pairs, tokens, seconds), if given, is called after
+    # every forward pass.
+
+    def __init__(self, model, tokenizer, labels=CONCERN_LABELS,
+                 hypothesis_template=HYPOTHESIS_TEMPLATE, batch_size=8, observe_batch=None):
+        self.model = model
+        self.observe_batch = observe_batch
+        self.tokenizer = tokenizer
+        self.labels = list(labels)
+        self.batch_size = batch_size
+
+        label2id = {label.lower(): idx for label, idx in model.config.label2id.items()}
+        self.entailment_id = next(idx for label, idx in label2id.items() if label.startswith("entail"))
+        self.contradiction_id = next(idx for label, idx in label2id.items() if label.startswith("contra"))
+
+        # Hypotheses never change, so encode them once up front
+        hypotheses = [hypothesis_template.format(label) for label in self.labels]
+        self.hypothesis_ids = tokenizer(hypotheses, add_special_tokens=False)["input_ids"]
+        self.max_length = min(tokenizer.model_max_length, model.config.max_position_embeddings)
+        self.special_tokens = tokenizer.num_special_tokens_to_add(pair=True)
+
+    def build_inputs(self, premise_ids):
+        features = []
+        for hypothesis_ids in self.hypothesis_ids:
+            # Truncate only the transcript, like the pipeline's "only_first"
+            budget = self.max_length - self.special_tokens - len(hypothesis_ids)
+            input_ids = self.tokenizer.build_inputs_with_special_tokens(premise_ids[:budget], hypothesis_ids)
+            features.append({"input_ids": input_ids})
+        return features
+
+    def score(self, text):
+        return self.score_many([text])[0]
+
+    def score_many(self, texts):
+        # Hypothesis pairs for several transcripts share the same padded batches
+        import torch
+
+        premises = self.tokenizer(texts, add_special_tokens=False)["input_ids"]
+        features = [feature for premise_ids in premises for feature in self.build_inputs(premise_ids)]
+
+        entailment = []
+        with torch.inference_mode():
+            for i in range(0, len(features), self.batch_size):
+                started = time.perf_counter()
+                batch = self.tokenizer.pad(features[i:i + self.batch_size], return_tensors="pt")
+                batch = {key: value.to(self.model.device) for key, value in batch.items()}
+                logits = self.model(**batch).logits
+                pair = logits[:, [self.contradiction_id, self.entailment_id]]
+                entailment.extend(pair.softmax(dim=-1)[:, 1].tolist())
+                if self.observe_batch is not None:
+                    self.observe_batch(
+                        len(batch["input_ids"]),
+                        int(batch["attention_mask"].sum()),
+                        time.perf_counter() - started
+                    )
+
+        results = []
+        for i in range(0, len(entailment), len(self.labels)):
+            ranked = sorted(zip(self.labels, entailment[i:i + len(self.labels)]), key=lambda item: item[1], reverse=True)
+            results.append({
+                "labels": [label for label, _ in ranked],
+                "scores": [score for _, score in ranked],
+            })
+        return results
@@ -0,0 +1,112 @@
+from contextlib import contextmanager
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+
+class Database:
+    # A shared pool of long-lived connections, opened in WAL mode so readers
+    # don't queue behind writers. Each statement borrows a connection and
+    # returns it, so a server that starts a thread per request still reuses
+    # connections. Up to pool_size idle connections are kept; the pool is
+    # emptied in a forked child so processes never share a handle.
+    # Connections run in autocommit mode; group writes with transaction().
+    # observe(operation, seconds), if given, is called after every
+    # statement and transaction, e.g. for metrics.
+
+    def __init__(self, path, mmap_bytes=256 * 1024 * 1024, cached_statements=256,
+                 cache_kib=16 * 1024, busy_timeout_ms=5000, observe=None, pool_size=8):
+        self.path = path
+        self.observe = observe
+        self.mmap_bytes = mmap_bytes
+        self.cached_statements = cached_statements
+        self.cache_kib = cache_kib
+        self.busy_timeout_ms = busy_timeout_ms
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue()
+        self._pid = os.getpid()
+        self._pid_lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,
+            cached_statements=self.cached_statements,
+            check_same_thread=False  # Pooled; only one thread holds it at a time
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_bytes)}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_kib)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        if self._pid != os.getpid():
+            with self._pid_lock:
+                if self._pid != os.getpid():
+                    # Inherited handles belong to the parent; drop, don't close
+                    self._pool = queue.LifoQueue()
+                    self._pid = os.getpid()
+        pool = self._pool
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if pool is self._pool and pool.qsize() < self.pool_size:
+                pool.put(conn)
+            else:
+                conn.close()
+
+    def _timed(self, sql, run):
+        if self.observe is None:
+            return run()
+        started = time.perf_counter()
+        try:
+            return run()
+        finally:
+            self.observe(sql.split(None, 1)[0].lower(), time.perf_counter() - started)
+
+    def _run(self, func):
+        with self.connection() as conn:
+            return func(conn)
+
+    def execute(self, sql, params=()):
+        # The cursor is only good for rowcount and lastrowid; use fetchone or
+        # fetchall to read rows
+        return self._timed(sql, lambda: self._run(lambda conn: conn.execute(sql, params)))
+
+    def fetchone(self, sql, params=()):
+        return self._timed(sql, lambda: self._run(lambda conn: conn.execute(sql, params).fetchone()))
+
+    def fetchall(self, sql, params=()):
+        return self._timed(sql, lambda: self._run(lambda conn: conn.execute(sql, params).fetchall()))
+
+    @contextmanager
+    def transaction(self, immediate=True):
+        # IMMEDIATE takes the write lock up front so two writers can't both
+        # read and then deadlock upgrading
+        started = time.perf_counter()
+        try:
+            with self.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                else:
+                    conn.execute("COMMIT")
+        finally:
+            if self.observe is not None:
+                self.observe("transaction", time.perf_counter() - started)
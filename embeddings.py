@@ -0,0 +1,267 @@
+from contextlib import contextmanager
+import os
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows, where there are no forked workers to coordinate
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Above this many stored vectors, searches go through an IVF index
+IVF_THRESHOLD = 20000
+IVF_PROBES = 8
+IVF_TRAIN_SAMPLE = 20000
+IVF_ITERATIONS = 10
+# Rows converted to float32 at a time when scanning the float16 file
+BLOCK_ROWS = 16384
+
+
+class SentenceEmbedder:
+    # Mean-pooled, L2-normalized sentence embeddings. Long transcripts are
+    # embedded window by window and the windows averaged.
+
+    def __init__(self, model_name=EMBEDDING_MODEL, max_tokens=256, batch_size=16):
+        from transformers import AutoModel, AutoTokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).eval()
+        self.dim = self.model.config.hidden_size
+        self.window = max_tokens - self.tokenizer.num_special_tokens_to_add()
+        self.batch_size = batch_size
+
+    def embed(self, text):
+        import torch
+
+        ids = self.tokenizer(text, add_special_tokens=False)["input_ids"]
+        features = [
+            {"input_ids": self.tokenizer.build_inputs_with_special_tokens(ids[i:i + self.window])}
+            for i in range(0, max(len(ids), 1), self.window)
+        ]
+
+        pooled = []
+        with torch.inference_mode():
+            for i in range(0, len(features), self.batch_size):
+                batch = self.tokenizer.pad(features[i:i + self.batch_size], return_tensors="pt")
+                hidden = self.model(**batch).last_hidden_state
+                mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                vectors = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+                pooled.append(torch.nn.functional.normalize(vectors, dim=-1))
+
+        vector = torch.cat(pooled).mean(dim=0)
+        return (vector / vector.norm().clamp(min=1e-12)).numpy().astype(np.float32)
+
+
+class EmbeddingIndex:
+    # Session embeddings in a float16 .npy file, memory-mapped, one row per
+    # session id (unused rows are zero). Searches read the mapping directly,
+    # converting BLOCK_ROWS rows at a time to float32, so every process
+    # shares the one copy in the page cache. Large corpora go through an
+    # inverted-file (IVF) index.
+    # Writers in different processes take turns through a lock file and
+    # append each row they write to a log of int64 session ids. The rows
+    # themselves show up through the shared mapping; other processes only
+    # read the log to update which rows are set. Only a grown (replaced) file
+    # is rescanned in full, and growth doubles the capacity, so that is rare.
+
+    def __init__(self, path, ivf_threshold=IVF_THRESHOLD, probes=IVF_PROBES):
+        self.path = path
+        self.log_path = path + ".log"
+        self.ivf_threshold = ivf_threshold
+        self.probes = probes
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._vectors = None
+        self._valid = None
+        self._version = None
+        self._log_offset = 0
+        self._centroids = None
+        self._lists = None
+        self._trained_on = 0
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size)
+
+    def _log_size(self):
+        try:
+            return os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            return 0
+
+    def _refresh(self):
+        version = self._file_version()
+        if version is None:
+            if self._version is not None:
+                self._reset()  # File removed: start over empty
+            return
+        log_size = self._log_size()
+        if version != self._version or log_size < self._log_offset:
+            self._reload(version, log_size)
+        elif log_size > self._log_offset:
+            self._apply_log(log_size)
+
+    def _reload(self, version, log_size):
+        # Reopen the file and find its set rows
+        vectors = np.load(self.path, mmap_mode="r+")
+        valid = np.zeros(len(vectors), dtype=bool)
+        for start in range(0, len(vectors), BLOCK_ROWS):
+            valid[start:start + BLOCK_ROWS] = np.any(vectors[start:start + BLOCK_ROWS] != 0, axis=1)
+        previous = self._valid
+        self._vectors, self._valid, self._version, self._log_offset = vectors, valid, version, log_size
+
+        if self._centroids is not None:
+            if previous is not None and len(previous) <= len(valid):
+                grown = np.zeros(len(valid), dtype=bool)
+                grown[:len(previous)] = previous
+                self._assign(np.flatnonzero(valid & ~grown))
+            else:
+                self._lists = None
+                self._centroids = None
+                self._trained_on = 0
+        self._maybe_train()
+
+    def _apply_log(self, log_size):
+        # Mark the rows other processes wrote since we last looked
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_offset)
+            ids = np.frombuffer(f.read(log_size - self._log_offset), dtype=np.int64)
+        self._log_offset = log_size
+        ids = np.unique(ids[ids < len(self._vectors)])
+        if not len(ids):
+            return
+        added = ids[~self._valid[ids]]
+        self._valid[ids] = True
+        if self._centroids is not None:
+            self._assign(added)
+        self._maybe_train()
+
+    def _grow(self, rows, dim):
+        capacity = max(1024, rows, 2 * (len(self._vectors) if self._vectors is not None else 0))
+        tmp_path = self.path + ".tmp"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float16, shape=(capacity, dim))
+        if self._vectors is not None:
+            grown[:len(self._vectors)] = self._vectors
+        grown.flush()
+        del grown
+        # Everyone reloads the new file in full, so the log starts over.
+        # Truncating first means a reader can never match an old log
+        # offset against entries for the new file.
+        open(self.log_path, "wb").close()
+        os.replace(tmp_path, self.path)
+        self._refresh()
+
+    @contextmanager
+    def _exclusive(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def add(self, session_id, vector):
+        with self._lock, self._exclusive():
+            self._refresh()
+            if self._vectors is None or session_id >= len(self._vectors):
+                self._grow(session_id + 1, len(vector))
+            self._vectors[session_id] = vector.astype(np.float16)
+            self._vectors.flush()
+            with open(self.log_path, "ab") as f:
+                f.write(np.int64(session_id).tobytes())
+            self._log_offset = self._log_size()
+
+            was_valid = self._valid[session_id]
+            self._valid[session_id] = True
+            if self._centroids is not None and not was_valid:
+                self._assign(np.array([session_id]))
+            self._maybe_train()
+
+    def get(self, session_id):
+        with self._lock:
+            self._refresh()
+            if self._valid is None or session_id >= len(self._valid) or not self._valid[session_id]:
+                return None
+            return self._rows(session_id)
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return 0 if self._valid is None else int(self._valid.sum())
+
+    def _rows(self, ids):
+        return self._vectors[ids].astype(np.float32)
+
+    def _maybe_train(self):
+        # (Re)train the IVF index when the corpus crosses the threshold or
+        # has doubled since the last training
+        count = int(self._valid.sum())
+        if count < self.ivf_threshold or count < 2 * self._trained_on:
+            return
+
+        rows = np.flatnonzero(self._valid)
+        rng = np.random.default_rng(0)
+        sample = self._rows(np.sort(rng.choice(rows, min(len(rows), IVF_TRAIN_SAMPLE), replace=False)))
+        centroids = sample[rng.choice(len(sample), int(np.sqrt(count)), replace=False)].copy()
+        for _ in range(IVF_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(len(centroids)):
+                members = sample[assignment == cluster]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[cluster] = centroid / max(np.linalg.norm(centroid), 1e-12)
+
+        self._centroids = centroids
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(len(centroids))]
+        self._trained_on = count
+        self._assign(rows)
+
+    def _assign(self, rows):
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = rows[start:start + BLOCK_ROWS]
+            assignment = np.argmax(self._rows(block) @ self._centroids.T, axis=1)
+            for cluster in np.unique(assignment):
+                self._lists[cluster] = np.concatenate([self._lists[cluster], block[assignment == cluster]])
+
+    def search(self, query, k=5, exclude=()):
+        # Top-k (session_id, cosine similarity); vectors are unit length so
+        # cosine is a dot product
+        with self._lock:
+            self._refresh()
+            if self._vectors is None:
+                return []
+            query = np.asarray(query, dtype=np.float32)
+
+            if self._centroids is not None:
+                probes = min(self.probes, len(self._centroids))
+                nearest = np.argpartition(-(self._centroids @ query), probes - 1)[:probes]
+                # In id order, so the rows are read front to back
+                candidates = np.sort(np.concatenate([self._lists[cluster] for cluster in nearest]))
+                if exclude:
+                    candidates = candidates[~np.isin(candidates, list(exclude))]
+                scores = self._rows(candidates) @ query
+            else:
+                # Scan the whole contiguous file; gathering rows first costs more
+                scores = np.empty(len(self._vectors), dtype=np.float32)
+                for start in range(0, len(self._vectors), BLOCK_ROWS):
+                    scores[start:start + BLOCK_ROWS] = self._rows(slice(start, start + BLOCK_ROWS)) @ query
+                scores[~self._valid] = -np.inf
+                for session_id in exclude:
+                    if session_id < len(scores):
+                        scores[session_id] = -np.inf
+                candidates = np.flatnonzero(scores > -np.inf)
+                scores = scores[candidates]
+            if not len(candidates):
+                return []
+
+            k = min(k, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(int(candidates[i]), float(scores[i])) for i in top]
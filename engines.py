@@ -0,0 +1,101 @@
+import os
+import time
+
+# "torch": the checkpoint as published (FP32)
+# "int8": the same weights with every Linear layer dynamically quantized to int8
+# "onnx": the checkpoint exported to ONNX and run by ONNX Runtime
+ENGINES = ("torch", "int8", "onnx")
+
+MODEL_CLASSES = {
+    "summarization": ("AutoModelForSeq2SeqLM", "ORTModelForSeq2SeqLM"),
+    "zero-shot-classification": ("AutoModelForSequenceClassification", "ORTModelForSequenceClassification"),
+}
+
+# Exported ONNX graphs are kept here so the export only happens once
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "database/onnx")
+
+
+def model_version(model_name, revision, engine):
+    # FP32 keeps the plain name@revision that stored sessions already use
+    version = f"{model_name}@{revision}"
+    return version if engine == "torch" else f"{version}+{engine}"
+
+
+def load_pipeline(task, model_name, revision, engine="torch"):
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {', '.join(ENGINES)}")
+
+    import transformers
+    tokenizer = transformers.AutoTokenizer.from_pretrained(model_name, revision=revision)
+    torch_class, onnx_class = MODEL_CLASSES[task]
+
+    if engine == "onnx":
+        try:
+            import optimum.onnxruntime
+        except ImportError:
+            raise RuntimeError("The onnx engine needs optimum with ONNX Runtime: pip install optimum[onnxruntime]")
+        model_class = getattr(optimum.onnxruntime, onnx_class)
+        export_dir = os.path.join(ONNX_CACHE_DIR, f"{model_name.replace('/', '--')}@{revision}")
+        if os.path.isdir(export_dir):
+            model = model_class.from_pretrained(export_dir)
+        else:
+            model = model_class.from_pretrained(model_name, revision=revision, export=True)
+            model.save_pretrained(export_dir)
+    else:
+        model = getattr(transformers, torch_class).from_pretrained(model_name, revision=revision).eval()
+        if engine == "int8":
+            import torch
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    return transformers.pipeline(task, model=model, tokenizer=tokenizer)
+
+
+def rouge_l(reference, candidate):
+    # ROUGE-L F1 over lowercased words
+    ref, cand = reference.lower().split(), candidate.lower().split()
+    if not ref or not cand:
+        return float(ref == cand)
+    previous = [0] * (len(cand) + 1)
+    for word in ref:
+        current = [0]
+        for j, other in enumerate(cand):
+            current.append(previous[j] + 1 if word == other else max(previous[j + 1], current[j]))
+        previous = current
+    lcs = previous[-1]
+    if not lcs:
+        return 0.0
+    precision, recall = lcs / len(cand), lcs / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+
+def accuracy_report(transcripts, baseline, candidate, threshold, min_rouge=0.8, max_score_delta=0.05):
+    # baseline and candidate map a transcript to (summary, {label: score}).
+    # The candidate passes if every summary stays within min_rouge of the
+    # FP32 one, no concern score moves more than max_score_delta, and the
+    # same concerns clear the reporting threshold.
+    rouges, deltas, flips = [], [], 0
+    timings = {"baseline": 0.0, "candidate": 0.0}
+    for text in transcripts:
+        started = time.perf_counter()
+        base_summary, base_scores = baseline(text)
+        timings["baseline"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        cand_summary, cand_scores = candidate(text)
+        timings["candidate"] += time.perf_counter() - started
+
+        rouges.append(rouge_l(base_summary, cand_summary))
+        deltas.append(max(abs(base_scores[label] - cand_scores[label]) for label in base_scores))
+        if {l for l, s in base_scores.items() if s > threshold} != {l for l, s in cand_scores.items() if s > threshold}:
+            flips += 1
+
+    passed = bool(transcripts) and min(rouges) >= min_rouge and max(deltas) <= max_score_delta and not flips
+    return {
+        "transcripts": len(transcripts),
+        "summary_rouge_l_mean": sum(rouges) / len(rouges) if rouges else None,
+        "summary_rouge_l_min": min(rouges) if rouges else None,
+        "concern_score_max_delta": max(deltas) if deltas else None,
+        "concern_label_flips": flips,
+        "speedup": timings["baseline"] / timings["candidate"] if timings["candidate"] else None,
+        "passed": passed,
+    }
@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+def process_alive(pid):
+    if pid is None or pid == os.getpid():
+        return False
+    if os.name == "nt":
+        return False  # os.kill would terminate it; no forked workers there anyway
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, owned by someone else
+    return True
+
+
+class JobQueue:
+    # Analysis jobs persisted in SQLite and run by a fixed pool of worker
+    # threads. Jobs that were queued or running when the process stopped
+    # are picked up again on the next start. Several processes may share
+    # the table; each running job records the pid that claimed it.
+
+    def __init__(self, db, workers=2, max_queued=100, poll_seconds=1.0):
+        self.db = db
+        self.workers = workers
+        self.max_queued = max_queued
+        self.poll_seconds = poll_seconds
+        self._handlers = {}
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Condition()
+
+        self.db.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            worker_pid INTEGER
+        )
+        ''')
+        columns = {row[1] for row in self.db.fetchall("PRAGMA table_info(jobs)")}
+        if "worker_pid" not in columns:
+            self.db.execute("ALTER TABLE jobs ADD COLUMN worker_pid INTEGER")
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at)")
+
+    def handler(self, kind):
+        def decorator(func):
+            self._handlers[kind] = func
+            return func
+        return decorator
+
+    def submit(self, kind, payload):
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        with self.db.transaction() as conn:
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                raise QueueFull(f"{queued} jobs already queued")
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(payload), time.time())
+            )
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        row = self.db.fetchone(
+            "SELECT id, kind, status, result, error, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+            (job_id,)
+        )
+        if not row:
+            return None
+        return {
+            "id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "result": json.loads(row[3]) if row[3] is not None else None,
+            "error": row[4],
+            "created_at": row[5],
+            "started_at": row[6],
+            "finished_at": row[7],
+        }
+
+    def queued_count(self):
+        return self.db.fetchone("SELECT COUNT(*) FROM jobs WHERE status = 'queued'")[0]
+
+    def requeue(self, worker_pid=None):
+        # Put interrupted jobs back in the queue: those claimed by
+        # worker_pid, or by default every running job whose process is gone.
+        # Jobs claimed under this process's own pid count as gone too, so
+        # call it before this process starts running jobs.
+        if worker_pid is not None:
+            pids = [worker_pid]
+        else:
+            claimed = self.db.fetchall("SELECT DISTINCT worker_pid FROM jobs WHERE status = 'running'")
+            pids = [pid for pid, in claimed if not process_alive(pid)]
+        for pid in pids:
+            self.db.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, worker_pid = NULL "
+                "WHERE status = 'running' AND worker_pid IS ?",
+                (pid,)
+            )
+
+    def start(self, requeue=True):
+        # Idempotent: requeue interrupted work, then spawn the worker pool
+        # once. Jobs that sibling worker processes are still running are
+        # left alone. Pass requeue=False when a supervisor requeues instead.
+        with self._start_lock:
+            if self._threads:
+                return
+            if requeue:
+                self.requeue()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _claim(self):
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT id, kind, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, worker_pid = ? WHERE id = ?",
+                    (time.time(), os.getpid(), row[0])
+                )
+        return row
+
+    def _finish(self, job_id, status, result=None, error=None):
+        self.db.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+        )
+
+    def _work(self):
+        # Database errors (e.g. still locked after the busy timeout) must not
+        # end the thread; the claim or the job's final state is retried
+        while True:
+            try:
+                job = self._claim()
+            except Exception:
+                logger.exception("Claiming a job failed")
+                job = None
+            if not job:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_seconds)
+                continue
+
+            job_id, kind, payload = job
+            try:
+                result = self._handlers[kind](**json.loads(payload))
+            except Exception as e:
+                logger.exception("Job %s (%s) failed", job_id, kind)
+                outcome = {"status": "failed", "error": str(e)}
+            else:
+                outcome = {"status": "done", "result": result}
+            self._finish_with_retries(job_id, **outcome)
+
+    def _finish_with_retries(self, job_id, status, result=None, error=None, attempts=5):
+        for _ in range(attempts):
+            try:
+                return self._finish(job_id, status, result, error)
+            except Exception as e:
+                logger.exception("Recording the outcome of job %s failed", job_id)
+                if not isinstance(e, sqlite3.Error):
+                    # A result that can't be stored fails the job instead of losing it
+                    status, result, error = "failed", None, f"Could not store the result: {e}"
+                time.sleep(self.poll_seconds)
+        logger.error("Job %s stays running until it is requeued", job_id)
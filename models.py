@@ -0,0 +1,75 @@
+import threading
+import time
+
+
+class ModelRegistry:
+    # Named model loaders that run on first use or in a background thread,
+    # so nothing heavy happens at import time
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._errors = {}
+        self._locks = {}
+        self._load_seconds = {}
+        self._warmup = None
+        self._warmup_lock = threading.Lock()
+
+    def register(self, name):
+        def decorator(loader):
+            self._loaders[name] = loader
+            self._locks[name] = threading.Lock()
+            return loader
+        return decorator
+
+    def get(self, name):
+        # Blocks until the model is loaded; concurrent callers share one load
+        if name in self._models:
+            return self._models[name]
+        with self._locks[name]:
+            if name not in self._models:
+                started = time.perf_counter()
+                try:
+                    model = self._loaders[name](self)
+                except Exception as e:
+                    self._errors[name] = e
+                    raise
+                # Bookkeeping first: status() reads it as soon as the model
+                # shows up in _models
+                self._errors.pop(name, None)
+                self._load_seconds[name] = time.perf_counter() - started
+                self._models[name] = model
+        return self._models[name]
+
+    def loaded(self):
+        return dict(self._models)
+
+    def load_all(self, names=None):
+        for name in self._loaders if names is None else names:
+            try:
+                self.get(name)
+            except Exception:
+                pass  # Recorded in _errors and reported by status()
+
+    def start_background(self):
+        # Idempotent: only the first call spawns the warm-up thread
+        with self._warmup_lock:
+            if self._warmup is None:
+                self._warmup = threading.Thread(target=self.load_all, name="model-warmup", daemon=True)
+                self._warmup.start()
+
+    def ready(self):
+        return all(name in self._models for name in self._loaders)
+
+    def status(self):
+        status = {}
+        for name in self._loaders:
+            if name in self._models:
+                status[name] = {"state": "loaded", "load_seconds": round(self._load_seconds[name], 2)}
+            elif name in self._errors:
+                status[name] = {"state": "failed", "error": str(self._errors[name])}
+            elif self._locks[name].locked():
+                status[name] = {"state": "loading"}
+            else:
+                status[name] = {"state": "pending"}
+        return status
@@ -0,0 +1,102 @@
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+import os
+import sys
+import threading
+
+# Seconds between stack samples; 5ms keeps overhead to a few percent
+SAMPLE_INTERVAL = 0.005
+TORCH_TABLE_ROWS = 60
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    # Wall-clock sampling profiler: a helper thread snapshots every other
+    # thread's Python stack on a timer and counts identical stacks. Model
+    # work runs on batcher and stream threads, so all threads are sampled,
+    # rooted at the thread name.
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        # Collapsed stacks, one "frame;frame;frame count" per line, as read
+        # by flamegraph.pl, speedscope and inferno
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def torch_profiler():
+    try:
+        import torch.profiler
+    except ImportError:
+        return None
+    return torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True)
+
+
+def profile_paths(directory, trace_id):
+    return {
+        "collapsed": os.path.join(directory, f"{trace_id}.collapsed"),
+        "ops": os.path.join(directory, f"{trace_id}.ops.txt"),
+    }
+
+
+@contextmanager
+def profile_request(trace_id, directory, interval=SAMPLE_INTERVAL):
+    # Profiles everything inside the block with the stack sampler and, when
+    # torch is installed, torch.profiler for the operators the models run.
+    # torch.profiler only sees the calling thread, so the block has to run
+    # its models there rather than on batcher threads.
+    # Writes <trace_id>.collapsed and <trace_id>.ops.txt under directory.
+    os.makedirs(directory, exist_ok=True)
+    paths = profile_paths(directory, trace_id)
+    sampler = StackSampler(interval)
+    operators = torch_profiler()
+
+    with ExitStack() as stack:
+        if operators is not None:
+            stack.enter_context(operators)
+        sampler.start()
+        stack.callback(sampler.stop)
+        # Only reached once both profilers are running, so a profiler that
+        # fails to start raises its own error rather than one from here
+        try:
+            yield paths
+        finally:
+            # A request that failed is still worth looking at
+            stack.close()
+            sampler.write(paths["collapsed"])
+            with open(paths["ops"], "w", encoding="utf-8") as f:
+                if operators is None:
+                    f.write("torch is not installed; no operator profile\n")
+                else:
+                    f.write(operators.key_averages().table(sort_by="self_cpu_time_total", row_limit=TORCH_TABLE_ROWS) + "\n")
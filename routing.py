@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+import threading
+
+
+class ModelTier:
+    # One summarizer + classifier pair. seconds_per_word are starting
+    # guesses for each stage's CPU cost; the router refines them from
+    # observed runs.
+
+    def __init__(self, name, summarizer_model, summarizer_revision, classifier_model, classifier_revision,
+                 summarize_seconds_per_word, insights_seconds_per_word):
+        self.name = name
+        self.summarizer_model = summarizer_model
+        self.summarizer_revision = summarizer_revision
+        self.classifier_model = classifier_model
+        self.classifier_revision = classifier_revision
+        self.seconds_per_word = {
+            "summarize": summarize_seconds_per_word,
+            "insights": insights_seconds_per_word,
+        }
+
+
+class TierRouter:
+    # Picks a tier per analysis, best quality first:
+    # - transcripts of at most short_words go straight to the fastest tier
+    # - every overload_depth analyses already in flight or queued step one
+    #   tier down
+    # - with a latency budget, the best remaining tier whose estimate fits
+    #   wins, else the fastest
+
+    def __init__(self, tiers, queued=lambda: 0, short_words=300, overload_depth=8, parallelism=8, smoothing=0.2):
+        self.tiers = list(tiers)
+        self.queued = queued
+        self.short_words = short_words
+        self.overload_depth = overload_depth
+        self.parallelism = parallelism
+        self.smoothing = smoothing
+        self.active = 0
+        self._lock = threading.Lock()
+        self._seconds_per_word = {tier.name: dict(tier.seconds_per_word) for tier in self.tiers}
+
+    def tier(self, name):
+        return next(tier for tier in self.tiers if tier.name == name)
+
+    def rank(self, tier):
+        return self.tiers.index(tier)
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def depth(self):
+        return self.active + self.queued()
+
+    def estimate(self, tier, words, depth=0):
+        # Concurrent analyses share batches, so load slows each one by
+        # roughly depth / parallelism rather than by depth
+        return words * sum(self._seconds_per_word[tier.name].values()) * (1 + depth / self.parallelism)
+
+    def choose(self, words, budget_seconds=None):
+        if words <= self.short_words:
+            return self.tiers[-1]
+
+        depth = self.depth()
+        candidates = self.tiers[min(depth // self.overload_depth, len(self.tiers) - 1):]
+        if budget_seconds is None:
+            return candidates[0]
+        for tier in candidates:
+            if self.estimate(tier, words, depth) <= budget_seconds:
+                return tier
+        return candidates[-1]
+
+    def observe(self, tier, stage, words, seconds):
+        # Exponentially weighted per-word cost from uncached runs
+        if words <= 0:
+            return
+        with self._lock:
+            costs = self._seconds_per_word[tier.name]
+            costs[stage] += self.smoothing * (seconds / words - costs[stage])
+
+    def status(self):
+        with self._lock:
+            return {
+                "active": self.active,
+                "seconds_per_word": {name: dict(costs) for name, costs in self._seconds_per_word.items()},
+            }
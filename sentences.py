@@ -0,0 +1,37 @@
+from array import array
+from bisect import bisect_left, bisect_right
+import re
+
+SENTENCE_TERMINATOR = re.compile(r"[.!?]")
+
+
+class SentenceIndex:
+    # Sorted table of sentence end offsets (just past each '.', '!' or '?'),
+    # built once per transcript so every lookup is a binary search
+
+    def __init__(self, text):
+        self.text = text
+        self.ends = array("q", (match.end() for match in SENTENCE_TERMINATOR.finditer(text)))
+
+    def __len__(self):
+        return len(self.ends)
+
+    def boundaries(self, start_pos, end_pos):
+        # Expand [start_pos, end_pos) outwards to whole sentences
+        i = bisect_right(self.ends, start_pos) - 1
+        sentence_start = self.ends[i] if i >= 0 else 0
+        if sentence_start > 0:
+            sentence_start += 1  # Skip the period and space
+
+        j = bisect_right(self.ends, end_pos)
+        sentence_end = self.ends[j] if j < len(self.ends) else len(self.text)
+
+        return sentence_start, sentence_end
+
+    def spans(self, start=0, end=None):
+        # (start, end) offsets of the sentences covering text[start:end]
+        end = len(self.text) if end is None else end
+        i = bisect_right(self.ends, start)
+        j = bisect_left(self.ends, end)
+        cuts = [start, *self.ends[i:j], end]
+        return [(a, b) for a, b in zip(cuts, cuts[1:]) if self.text[a:b].strip()]
@@ -0,0 +1,159 @@
+import re
+import threading
+import time
+
+from sentences import SentenceIndex
+
+# BART reads at most 1024 tokens; leave room for <s>, </s> and tokenizer drift
+CHUNK_TOKENS = 900
+
+# How many windows go through the model together during the map step
+BATCH_SIZE = 4
+
+SUMMARY_KWARGS = {
+    "max_length": 150,
+    "min_length": 30,
+    "do_sample": False,
+}
+
+LINE = re.compile(r"[^\n]*\S[^\n]*")
+
+
+def count_tokens(tokenizer, texts):
+    if not texts:
+        return []
+    encoded = tokenizer(texts, add_special_tokens=False)["input_ids"]
+    return [len(ids) for ids in encoded]
+
+
+def split_oversized(tokenizer, text, start, end, max_tokens):
+    # Last resort for a single run-on sentence: cut it on token windows
+    offsets = tokenizer(
+        text[start:end],
+        add_special_tokens=False,
+        return_offsets_mapping=True
+    )["offset_mapping"]
+    return [
+        (start + window[0][0], start + window[-1][1], len(window))
+        for window in (offsets[i:i + max_tokens] for i in range(0, len(offsets), max_tokens))
+    ]
+
+
+def split_units(tokenizer, text, index, max_tokens):
+    # Speaker turns (one per line) are the natural unit; fall back to
+    # sentences, then to raw token windows, so nothing is ever dropped.
+    # Units are (start, end, tokens) spans into text.
+    lines = [(match.start(), match.end()) for match in LINE.finditer(text)]
+    units = []
+    for (start, end), size in zip(lines, count_tokens(tokenizer, [text[a:b] for a, b in lines])):
+        if size <= max_tokens:
+            units.append((start, end, size))
+            continue
+        sentences = index.spans(start, end)
+        for (a, b), sentence_size in zip(sentences, count_tokens(tokenizer, [text[a:b] for a, b in sentences])):
+            if sentence_size <= max_tokens:
+                units.append((a, b, sentence_size))
+            else:
+                units.extend(split_oversized(tokenizer, text, a, b, max_tokens))
+    return units
+
+
+def chunk_transcript(tokenizer, text, max_tokens=CHUNK_TOKENS, index=None, stats=None):
+    # Greedily pack consecutive units into windows of at most max_tokens.
+    # Chunks are slices of the original text, so formatting is preserved.
+    if index is None:
+        index = SentenceIndex(text)
+
+    units = split_units(tokenizer, text, index, max_tokens)
+    if stats is not None:
+        stats["tokens"] = stats.get("tokens", 0) + sum(size for _, _, size in units)
+
+    chunks = []
+    chunk_start, chunk_end, chunk_size = None, None, 0
+    for start, end, size in units:
+        # +1 for the separator between units
+        if chunk_start is not None and chunk_size + size + 1 > max_tokens:
+            chunks.append(text[chunk_start:chunk_end].strip())
+            chunk_start, chunk_size = None, 0
+        if chunk_start is None:
+            chunk_start = start
+        chunk_end = end
+        chunk_size += size + 1
+    if chunk_start is not None:
+        chunks.append(text[chunk_start:chunk_end].strip())
+    return chunks
+
+
+def summarize_transcript(summarizer, text, max_tokens=CHUNK_TOKENS, batch_size=BATCH_SIZE, index=None,
+                         progress=None, finish=None, stats=None, pass_number=1, **kwargs):
+    # Map-reduce summarization: summarize each window, then summarize the
+    # joined partial summaries until everything fits in a single window.
+    # progress(pass_number, done, total) is called as map batches complete, and
+    # finish(chunk, **kwargs), if given, produces the last single-window
+    # summary instead of summarizer (e.g. a streaming generation).
+    # stats, if given, accumulates tokens, chunks, chunk_seconds and
+    # generate_seconds across all passes.
+    kwargs = {**SUMMARY_KWARGS, **kwargs}
+    started = time.perf_counter()
+    chunks = chunk_transcript(summarizer.tokenizer, text, max_tokens, index, stats)
+    if stats is not None:
+        stats["chunks"] = stats.get("chunks", 0) + len(chunks)
+        stats["chunk_seconds"] = stats.get("chunk_seconds", 0.0) + time.perf_counter() - started
+    if not chunks:
+        return ""
+
+    started = time.perf_counter()
+    try:
+        if len(chunks) == 1 and finish is not None:
+            return finish(chunks[0], **kwargs).strip()
+        partials = map_chunks(summarizer, chunks, batch_size, progress, pass_number, kwargs)
+    finally:
+        if stats is not None:
+            stats["generate_seconds"] = stats.get("generate_seconds", 0.0) + time.perf_counter() - started
+    if len(partials) == 1:
+        return partials[0]
+
+    return summarize_transcript(
+        summarizer, "\n".join(partials), max_tokens, batch_size,
+        progress=progress, finish=finish, stats=stats, pass_number=pass_number + 1, **kwargs
+    )
+
+
+def map_chunks(summarizer, chunks, batch_size, progress, pass_number, kwargs):
+    # Without a progress callback every window goes in at once so the
+    # pipeline can batch them freely
+    step = batch_size if progress else len(chunks)
+    partials = []
+    for i in range(0, len(chunks), step):
+        outputs = summarizer(chunks[i:i + step], batch_size=batch_size, truncation=True, **kwargs)
+        partials.extend(output["summary_text"].strip() for output in outputs)
+        if progress:
+            progress(pass_number, len(partials), len(chunks))
+    return partials
+
+
+def stream_summary(summarizer, chunk, on_text, **kwargs):
+    # Generate one window's summary on a helper thread and hand each piece
+    # of decoded text to on_text as soon as the streamer yields it
+    from transformers import TextIteratorStreamer
+
+    streamer = TextIteratorStreamer(summarizer.tokenizer, skip_special_tokens=True)
+    result = {}
+
+    def generate():
+        try:
+            result["outputs"] = summarizer(chunk, truncation=True, streamer=streamer, **kwargs)
+        except BaseException as e:
+            result["error"] = e
+            streamer.end()  # Unblock the reader below
+
+    thread = threading.Thread(target=generate, name="summary-stream", daemon=True)
+    thread.start()
+    for text in streamer:
+        if text:
+            on_text(text)
+    thread.join()
+
+    if "error" in result:
+        raise result["error"]
+    return result["outputs"][0]["summary_text"]
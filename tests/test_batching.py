@@ -0,0 +1,174 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from batching import BatchedPipeline, MicroBatcher, SingleFlight
+
+TIMEOUT = 5
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+class GatedBatch:
+    # run_batch that records each batch and holds the first one until
+    # released, so later submissions pile up behind it
+    def __init__(self, func=lambda items: [item * 2 for item in items]):
+        self.func = func
+        self.batches = []
+        self.release = threading.Event()
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        if len(self.batches) == 1:
+            self.release.wait(TIMEOUT)
+        return self.func(items)
+
+
+def test_concurrent_submits_share_a_batch_and_get_their_own_results():
+    run_batch = GatedBatch()
+    batcher = MicroBatcher(run_batch, max_batch_size=8, max_wait_ms=5)
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        first = pool.submit(batcher.submit, 0)
+        wait_until(lambda: run_batch.batches)
+        rest = {i: pool.submit(batcher.submit, i) for i in range(1, 6)}
+        wait_until(lambda: batcher.pending() == 5)
+        run_batch.release.set()
+
+        assert first.result(TIMEOUT) == 0
+        assert {i: future.result(TIMEOUT) for i, future in rest.items()} == {i: 2 * i for i in range(1, 6)}
+    assert run_batch.batches[0] == [0]
+    assert sorted(run_batch.batches[1]) == [1, 2, 3, 4, 5]
+
+
+def test_batches_are_capped_at_max_batch_size():
+    run_batch = GatedBatch()
+    batcher = MicroBatcher(run_batch, max_batch_size=3, max_wait_ms=5)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        pool.submit(batcher.submit, 0)
+        wait_until(lambda: run_batch.batches)
+        futures = [pool.submit(batcher.submit, i) for i in range(1, 8)]
+        wait_until(lambda: batcher.pending() == 7)
+        run_batch.release.set()
+        assert sorted(future.result(TIMEOUT) for future in futures) == [2 * i for i in range(1, 8)]
+    assert [len(batch) for batch in run_batch.batches] == [1, 3, 3, 1]
+
+
+def test_a_callers_items_stay_together_and_in_order():
+    batcher = MicroBatcher(lambda items: [item.upper() for item in items], max_batch_size=8)
+    assert batcher.submit_many(["a", "b", "c"]) == ["A", "B", "C"]
+
+
+def test_an_exception_reaches_every_waiter():
+    def fail(items):
+        raise ValueError("model crashed")
+
+    run_batch = GatedBatch(fail)
+    batcher = MicroBatcher(run_batch, max_batch_size=8, max_wait_ms=5)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        first = pool.submit(batcher.submit, 0)
+        wait_until(lambda: run_batch.batches)
+        rest = [pool.submit(batcher.submit, i) for i in range(1, 4)]
+        wait_until(lambda: batcher.pending() == 3)
+        run_batch.release.set()
+        for future in [first, *rest]:
+            with pytest.raises(ValueError, match="model crashed"):
+                future.result(TIMEOUT)
+    assert len(run_batch.batches) == 2
+
+
+def test_too_few_results_fail_every_caller_instead_of_hanging():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=8)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(batcher.submit_many, ["a", "b"])
+        with pytest.raises(RuntimeError, match="1 results for 2 items"):
+            future.result(TIMEOUT)
+
+
+class FakePipeline:
+    task = "summarization"
+    tokenizer = object()
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, batch_size=None, **kwargs):
+        self.calls.append((list(texts), batch_size, kwargs))
+        return [{"summary_text": f"{text}:{kwargs.get('max_length')}"} for text in texts]
+
+
+def test_batched_pipeline_keeps_generation_arguments_apart():
+    pipeline = FakePipeline()
+    batched = BatchedPipeline(pipeline)
+    assert batched(["a", "b"], batch_size=1, max_length=10) == [{"summary_text": "a:10"}, {"summary_text": "b:10"}]
+    assert batched("c", max_length=20) == [{"summary_text": "c:20"}]
+    assert pipeline.calls == [(["a", "b"], 2, {"max_length": 10}), (["c"], 1, {"max_length": 20})]
+    assert batched.tokenizer is pipeline.tokenizer
+    assert batched.pending() == 0
+
+
+def test_batched_pipeline_enqueue_returns_a_future_per_window():
+    batched = BatchedPipeline(FakePipeline())
+    futures = batched.enqueue(["a", "b"], max_length=10)
+    assert [future.result(TIMEOUT) for future in futures] == [{"summary_text": "a:10"}, {"summary_text": "b:10"}]
+
+
+def waiting_on(future):
+    # Threads blocked in future.result()
+    return len(future._condition._waiters)
+
+
+def test_single_flight_followers_share_the_leaders_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(TIMEOUT)
+        return "summary"
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        leader = pool.submit(flight.do, 7, work)
+        wait_until(lambda: calls)
+        followers = [pool.submit(flight.do, 7, work) for _ in range(2)]
+        wait_until(lambda: waiting_on(flight._inflight[7]) == 2)
+        release.set()
+        assert [future.result(TIMEOUT) for future in [leader, *followers]] == ["summary"] * 3
+    assert len(calls) == 1
+    assert flight._inflight == {}
+
+
+def test_single_flight_followers_see_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+    started = threading.Event()
+
+    def work():
+        started.set()
+        release.wait(TIMEOUT)
+        raise RuntimeError("session kept changing")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, 7, work)
+        started.wait(TIMEOUT)
+        follower = pool.submit(flight.do, 7, work)
+        wait_until(lambda: waiting_on(flight._inflight[7]) == 1)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError, match="kept changing"):
+                future.result(TIMEOUT)
+    # Nothing is remembered once the flight lands
+    assert flight.do(7, lambda: "again") == "again"
+
+
+def test_single_flight_keys_run_independently():
+    flight = SingleFlight()
+    assert flight.do(1, lambda: "one") == "one"
+    assert flight.do(2, lambda: "two") == "two"
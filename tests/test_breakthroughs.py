@@ -0,0 +1,41 @@
+from breakthroughs import MAX_BREAKTHROUGHS, find_breakthroughs
+
+# Far more than CONTEXT_CHARS on each side, so excerpts around it never meet
+FILLER = " ".join(["We talked about the weather for a while."] * 10)
+
+
+def test_overlapping_matches_of_every_alternative_make_one_excerpt():
+    text = f"{FILLER} I realized it was fear. Now I see the pattern. It became clear to me. {FILLER}"
+    breakthroughs = find_breakthroughs(text)
+    assert len(breakthroughs) == 1
+    for phrase in ("I realized it was fear.", "Now I see the pattern.", "It became clear to me."):
+        assert phrase in breakthroughs[0]
+
+
+def test_excerpts_come_in_document_order():
+    text = f"It became clear I was angry. {FILLER} Now I understand my mother. {FILLER} I learned to rest."
+    breakthroughs = find_breakthroughs(text)
+    assert len(breakthroughs) == 3
+    assert "It became clear I was angry." in breakthroughs[0]
+    assert "Now I understand my mother." in breakthroughs[1]
+    assert breakthroughs[2].endswith("I learned to rest.")
+
+
+def test_identical_excerpts_are_reported_once():
+    passage = "I realized I was tired of pretending."
+    text = f"{FILLER} {passage} {FILLER} {passage} {FILLER}"
+    first, *rest = find_breakthroughs(text)
+    assert passage in first
+    assert rest == []
+
+
+def test_stops_at_max_breakthroughs():
+    text = " ".join(f"I discovered thing {i}. {FILLER}" for i in range(MAX_BREAKTHROUGHS + 2))
+    breakthroughs = find_breakthroughs(text)
+    assert len(breakthroughs) == MAX_BREAKTHROUGHS
+    assert all(f"I discovered thing {i}." in breakthroughs[i] for i in range(MAX_BREAKTHROUGHS))
+    assert find_breakthroughs(text, limit=1) == breakthroughs[:1]
+
+
+def test_no_key_phrases_means_no_breakthroughs():
+    assert find_breakthroughs(FILLER) == []
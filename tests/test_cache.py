@@ -0,0 +1,89 @@
+import itertools
+import json
+
+import pytest
+
+import cache
+from cache import ResultCache, cache_key
+from db import Database
+
+PARAMS = {"model": "bart@main", "max_length": 130}
+
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / "cache.db"))
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    # Strictly increasing last_used, so eviction order never ties
+    ticks = itertools.count()
+    monkeypatch.setattr(cache.time, "time", lambda: float(next(ticks)))
+
+
+def stored_keys(db):
+    return {row[0] for row in db.fetchall("SELECT key FROM results")}
+
+
+def test_key_ignores_whitespace_only_edits():
+    assert cache_key("summary", "I feel  tired\n today", PARAMS) == cache_key("summary", "I feel tired today", PARAMS)
+
+
+@pytest.mark.parametrize("changed", [
+    {"model": "distilbart@main", "max_length": 130},
+    {"model": "bart@v2", "max_length": 130},
+    {"model": "bart@main", "max_length": 60},
+    {**PARAMS, "num_beams": 4},
+])
+def test_key_changes_with_model_or_params(changed):
+    assert cache_key("summary", "text", changed) != cache_key("summary", "text", PARAMS)
+
+
+def test_key_changes_with_namespace_and_text():
+    key = cache_key("summary", "text", PARAMS)
+    assert cache_key("insights", "text", PARAMS) != key
+    assert cache_key("summary", "other text", PARAMS) != key
+
+
+def test_get_or_compute_computes_once(db):
+    results = ResultCache(db)
+    calls = []
+    compute = lambda: calls.append(1) or {"summary": "s"}
+    assert results.get_or_compute("summary", "text", PARAMS, compute) == {"summary": "s"}
+    assert results.get_or_compute("summary", "text ", PARAMS, compute) == {"summary": "s"}
+    assert len(calls) == 1
+    assert (results.hits, results.misses) == (1, 1)
+
+
+def test_memory_tier_evicts_least_recently_used(db):
+    results = ResultCache(db, memory_entries=2)
+    results.set("a", 1)
+    results.set("b", 2)
+    results.get("a")
+    results.set("c", 3)
+    assert list(results._memory) == ["a", "c"]
+    # Still on disk, and promoted back into memory when read
+    assert results.get("b") == 2
+    assert list(results._memory) == ["c", "b"]
+
+
+def test_disk_tier_evicts_least_recently_used_to_fit(db):
+    value = "x" * 90
+    size = len(json.dumps(value))
+    results = ResultCache(db, memory_entries=0, max_bytes=3 * size)
+    for key in "abc":
+        results.set(key, value)
+    results.get("a")
+    results.set("d", value)
+    assert stored_keys(db) == {"a", "c", "d"}
+    assert results.get("b") is None
+
+
+def test_disk_eviction_walks_past_one_page_of_rows(db):
+    results = ResultCache(db, memory_entries=0)
+    for i in range(150):
+        results.set(f"old{i}", i)
+    results.max_bytes = 2 * len(json.dumps("new"))
+    results.set("new", "new")
+    assert stored_keys(db) == {"old149", "new"}
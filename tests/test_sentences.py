@@ -0,0 +1,33 @@
+from sentences import SentenceIndex
+
+TEXT = "I was tired. Then I realized something! Was it work? Maybe"
+
+
+def test_boundaries_expand_to_whole_sentences():
+    index = SentenceIndex(TEXT)
+    start = TEXT.index("realized")
+    assert TEXT[slice(*index.boundaries(start, start + 8))] == "Then I realized something!"
+
+
+def test_boundaries_at_the_start_and_end_of_the_text():
+    index = SentenceIndex(TEXT)
+    assert index.boundaries(0, 3) == (0, TEXT.index(".") + 1)
+    start = TEXT.index("Maybe")
+    assert TEXT[slice(*index.boundaries(start, start + 2))] == "Maybe"
+
+
+def test_boundaries_spanning_several_sentences():
+    index = SentenceIndex(TEXT)
+    start, end = index.boundaries(TEXT.index("tired"), TEXT.index("work"))
+    assert TEXT[start:end] == "I was tired. Then I realized something! Was it work?"
+
+
+def test_boundaries_without_terminators():
+    index = SentenceIndex("no punctuation at all")
+    assert len(index) == 0
+    assert index.boundaries(3, 5) == (0, len("no punctuation at all"))
+
+
+def test_spans_skip_blank_pieces():
+    index = SentenceIndex("One. Two.  ")
+    assert ["One. Two.  "[a:b].strip() for a, b in index.spans()] == ["One.", "Two."]
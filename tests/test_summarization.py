@@ -0,0 +1,59 @@
+import re
+
+from summarization import chunk_transcript
+
+WORD = re.compile(r"\S+")
+
+
+class WordTokenizer:
+    # One token per whitespace-separated word
+    def __call__(self, texts, add_special_tokens=True, return_offsets_mapping=False):
+        if isinstance(texts, str):
+            offsets = [match.span() for match in WORD.finditer(texts)]
+            encoded = {"input_ids": list(range(len(offsets)))}
+            if return_offsets_mapping:
+                encoded["offset_mapping"] = offsets
+            return encoded
+        return {"input_ids": [self(text)["input_ids"] for text in texts]}
+
+
+def words(chunks):
+    return " ".join(chunks).split()
+
+
+def test_short_transcript_is_one_chunk():
+    text = "Therapist: How are you?\nClient: Tired, mostly."
+    assert chunk_transcript(WordTokenizer(), text, max_tokens=50) == [text]
+
+
+def test_chunks_respect_the_token_limit_and_keep_every_word():
+    text = "\n".join(f"Client: line {i} has a few words in it." for i in range(40))
+    chunks = chunk_transcript(WordTokenizer(), text, max_tokens=30)
+    assert len(chunks) > 1
+    assert all(len(chunk.split()) <= 30 for chunk in chunks)
+    assert words(chunks) == text.split()
+
+
+def test_long_turns_split_on_sentences():
+    turn = "Client: " + " ".join(f"Sentence number {i} is here." for i in range(20))
+    chunks = chunk_transcript(WordTokenizer(), turn, max_tokens=12)
+    assert all(len(chunk.split()) <= 12 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert words(chunks) == turn.split()
+
+
+def test_run_on_sentences_split_on_token_windows():
+    text = " ".join(f"word{i}" for i in range(50))
+    chunks = chunk_transcript(WordTokenizer(), text, max_tokens=10)
+    assert all(len(chunk.split()) <= 10 for chunk in chunks)
+    assert words(chunks) == text.split()
+
+
+def test_stats_count_tokens():
+    stats = {}
+    chunk_transcript(WordTokenizer(), "a b c.\nd e.", max_tokens=10, stats=stats)
+    assert stats["tokens"] == 5
+
+
+def test_empty_transcript_has_no_chunks():
+    assert chunk_transcript(WordTokenizer(), "  \n ", max_tokens=10) == []
@@ -0,0 +1,125 @@
+import io
+import wave
+
+import pytest
+
+from transcription import ChunkedTranscriber, StubTranscriber, plan_segments, stitch
+
+RATE = 16000
+
+
+def wav_bytes(seconds, rate=RATE):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(rate)
+        writer.writeframes(bytes(2 * int(seconds * rate)))
+    return buffer.getvalue()
+
+
+def reader_for(seconds):
+    return wave.open(io.BytesIO(wav_bytes(seconds)), "rb")
+
+
+def test_stitch_drops_words_heard_in_both_segments():
+    texts = ["we talked about work and how it makes me tired",
+             "how it makes me tired every single evening"]
+    assert stitch(texts) == "we talked about work and how it makes me tired every single evening"
+
+
+def test_stitch_matches_despite_punctuation_and_case():
+    texts = ["I feel stuck at home. Really",
+             "stuck at home, really. But I try"]
+    assert stitch(texts) == "I feel stuck at home. Really But I try"
+
+
+def test_stitch_keeps_a_repeated_phrase_away_from_the_cut():
+    phrase = "I don't know what to say about it"
+    first = f"so when she asked me {phrase} and I just sat there for a while thinking about the week and the job and my brother and everything else going on"
+    second = f"everything else going on at home then later I told my therapist {phrase} again because it was true and we left it there for the evening"
+    stitched = stitch([first, second], max_overlap_words=40)
+    assert stitched == first + " " + second.split(" ", 4)[4]
+    assert stitched.count(phrase) == 2
+
+
+def test_stitch_ignores_a_shared_run_that_does_not_span_the_cut():
+    first = "we kept coming back to how it makes me tired and then moved on to my sister"
+    second = "at dinner she said how it makes me tired too which surprised me a lot"
+    assert stitch([first, second], max_overlap_words=40) == first + " " + second
+
+
+def test_stitch_tolerates_garbled_words_at_the_cut():
+    texts = ["and then I went home and slept for a lo",
+             "ng went home and slept for a long time afterwards"]
+    assert stitch(texts) == "and then I went home and slept for a long time afterwards"
+
+
+def test_stitch_keeps_everything_without_an_overlap():
+    assert stitch(["first part here", "second part there"]) == "first part here second part there"
+
+
+def test_stitch_single_and_empty():
+    assert stitch(["only one"]) == "only one"
+    assert stitch([]) == ""
+
+
+def test_plan_segments_covers_the_recording_with_overlap():
+    segments = plan_segments(reader_for(20), segment_seconds=6, overlap_seconds=1)
+    assert segments[0][0] == 0
+    assert segments[-1][1] == 20 * RATE
+    for (start, end), (next_start, _) in zip(segments, segments[1:]):
+        assert start < next_start < end
+        assert end - next_start <= 1 * RATE
+
+
+def test_plan_segments_short_recording_is_one_segment():
+    assert plan_segments(reader_for(5), segment_seconds=6, overlap_seconds=1) == [(0, 5 * RATE)]
+
+
+@pytest.mark.parametrize("segment_seconds", [0.5, 1, 2])
+def test_plan_segments_terminates_below_the_silence_search_radius(segment_seconds):
+    segments = plan_segments(reader_for(20), segment_seconds, 0.25)
+    starts = [start for start, _ in segments]
+    assert starts == sorted(set(starts))
+    assert segments[-1][1] == 20 * RATE
+
+
+def test_chunked_transcriber_rejects_non_positive_segments():
+    with pytest.raises(ValueError):
+        ChunkedTranscriber(StubTranscriber(), segment_seconds=0)
+
+
+class FlakyStub(StubTranscriber):
+    # Fails the first attempt at one segment only
+    def __init__(self, failing):
+        self.failing = failing
+        self.calls = []
+
+    def transcribe(self, f, filename, content_type=None):
+        self.calls.append(filename)
+        if filename == self.failing and self.calls.count(filename) == 1:
+            raise RuntimeError("transient")
+        return super().transcribe(f, filename, content_type)
+
+
+def test_chunked_transcriber_retries_only_the_failed_segment():
+    stub = FlakyStub("session-1.wav")
+    transcriber = ChunkedTranscriber(stub, segment_seconds=6, overlap_seconds=1, workers=2, backoff_seconds=0)
+    text = transcriber(io.BytesIO(wav_bytes(20)), "session.wav", "audio/wav")
+
+    segments = sorted(set(stub.calls))
+    assert len(segments) > 2
+    assert stub.calls.count("session-1.wav") == 2
+    assert all(stub.calls.count(name) == 1 for name in segments if name != "session-1.wav")
+    assert text.startswith("[session-0.wav:")
+
+
+def test_chunked_transcriber_gives_up_after_retries():
+    class Broken(StubTranscriber):
+        def transcribe(self, f, filename, content_type=None):
+            raise RuntimeError("down")
+
+    transcriber = ChunkedTranscriber(Broken(), segment_seconds=6, overlap_seconds=1, retries=1, backoff_seconds=0)
+    with pytest.raises(RuntimeError):
+        transcriber(io.BytesIO(wav_bytes(20)), "session.wav", "audio/wav")
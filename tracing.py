@@ -0,0 +1,126 @@
+from collections import deque
+from contextlib import contextmanager
+import json
+import threading
+import time
+import uuid
+
+
+class Span:
+    def __init__(self, name, trace_id, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+        self.children = []
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+    def finish(self, duration=None):
+        self.duration = time.perf_counter() - self._started if duration is None else duration
+
+    def to_dict(self, origin=None):
+        # Offsets are relative to the root span's start
+        origin = self.started_at if origin is None else origin
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "offset_ms": round(1000 * (self.started_at - origin), 3),
+            "duration_ms": round(1000 * (self.duration or 0.0), 3),
+            "attributes": self.attributes,
+            "error": self.error,
+            "children": [child.to_dict(origin) for child in self.children],
+        }
+
+
+class Tracer:
+    # Request-scoped span trees. trace() opens a root span on the current
+    # thread and span() nests under whatever is open there; outside a trace
+    # span() does nothing. Finished traces go to a bounded ring buffer and,
+    # optionally, one JSON line each to a file.
+
+    def __init__(self, capacity=500, path=None, enabled=True):
+        self.enabled = enabled
+        self.path = path
+        self._traces = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def current(self):
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def _enter(self, span):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.finish()
+            stack.pop()
+
+    @contextmanager
+    def trace(self, name, **attributes):
+        if not self.enabled:
+            yield None
+            return
+        root = Span(name, uuid.uuid4().hex, attributes=attributes)
+        try:
+            with self._enter(root):
+                yield root
+        finally:
+            self._record(root)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        parent = self.current()
+        if parent is None:
+            yield None
+            return
+        span = Span(name, parent.trace_id, parent, attributes)
+        parent.children.append(span)
+        with self._enter(span):
+            yield span
+
+    def add_span(self, name, seconds, **attributes):
+        # Record a span that just ended, timed by the caller
+        parent = self.current()
+        if parent is None:
+            return
+        span = Span(name, parent.trace_id, parent, attributes)
+        span.started_at -= seconds
+        span.finish(seconds)
+        parent.children.append(span)
+
+    def _record(self, root):
+        trace = {
+            "trace_id": root.trace_id,
+            "name": root.name,
+            "started_at": root.started_at,
+            "duration_ms": round(1000 * root.duration, 3),
+            "error": root.error,
+            "root": root.to_dict(),
+        }
+        with self._lock:
+            self._traces.append(trace)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace) + "\n")
+
+    def get(self, trace_id):
+        with self._lock:
+            return next((trace for trace in self._traces if trace["trace_id"] == trace_id), None)
+
+    def slowest(self, limit=50):
+        with self._lock:
+            traces = list(self._traces)
+        return sorted(traces, key=lambda trace: trace["duration_ms"], reverse=True)[:limit]
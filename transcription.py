@@ -0,0 +1,259 @@
+from concurrent.futures import ThreadPoolExecutor
+import io
+import math
+import re
+import threading
+import time
+import wave
+
+import numpy as np
+
+SEGMENT_SECONDS = 300
+OVERLAP_SECONDS = 5
+
+# How far either side of a planned cut to look for a pause to cut on
+SILENCE_SEARCH_SECONDS = 2
+SILENCE_WINDOW_SECONDS = 0.02
+
+# Fast conversational speech, used to size the overlap stitching looks at
+WORDS_PER_SECOND = 4
+# Words at a cut that the two segments may render differently
+EDGE_WORDS = 2
+
+SAMPLE_TYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+
+class Transcriber:
+    # Turns one audio file-like object into text. Implementations are called
+    # from several threads at once by ChunkedTranscriber.
+    name = None
+
+    def transcribe(self, f, filename, content_type=None):
+        raise NotImplementedError
+
+    def __call__(self, f, filename, content_type=None):
+        return self.transcribe(f, filename, content_type)
+
+
+class OpenAITranscriber(Transcriber):
+    name = "openai"
+
+    def __init__(self, api_key=None, model="gpt-4o-transcribe"):
+        from openai import OpenAI
+        self.client = OpenAI(api_key=api_key)
+        self.model = model
+
+    def transcribe(self, f, filename, content_type=None):
+        # The filename tells the API which audio format it is getting
+        transcription = self.client.audio.transcriptions.create(
+            model=self.model,
+            file=(filename, f, content_type)
+        )
+        return transcription.text
+
+
+class LocalWhisperTranscriber(Transcriber):
+    # Whisper on CPU through faster-whisper (CTranslate2) with int8 weights:
+    # no network round trip and no audio leaving the machine
+    name = "local"
+
+    def __init__(self, model="small", compute_type="int8", cpu_threads=0, workers=1, beam_size=1):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise RuntimeError("TRANSCRIPTION_BACKEND=local needs faster-whisper: pip install faster-whisper")
+        self.model = WhisperModel(
+            model,
+            device="cpu",
+            compute_type=compute_type,
+            cpu_threads=cpu_threads,
+            num_workers=workers
+        )
+        self.beam_size = beam_size
+
+    def transcribe(self, f, filename, content_type=None):
+        segments, _ = self.model.transcribe(f, beam_size=self.beam_size, vad_filter=True)
+        return " ".join(segment.text.strip() for segment in segments)
+
+
+class StubTranscriber(Transcriber):
+    # Local stand-in backend for tests and offline runs: no network, and
+    # the output only depends on the audio it was given
+    name = "stub"
+
+    def transcribe(self, f, filename, content_type=None):
+        with wave.open(f, "rb") as reader:
+            seconds = reader.getnframes() / reader.getframerate()
+        return f"[{filename}: {seconds:.1f}s]"
+
+
+TRANSCRIBERS = {
+    transcriber.name: transcriber
+    for transcriber in (OpenAITranscriber, LocalWhisperTranscriber, StubTranscriber)
+}
+
+
+def create_transcriber(backend, **options):
+    if backend not in TRANSCRIBERS:
+        raise ValueError(f"Unknown transcription backend {backend!r}, expected one of {sorted(TRANSCRIBERS)}")
+    return TRANSCRIBERS[backend](**options)
+
+
+def quietest_frame(reader, target, search_frames, window_frames):
+    # Snap a cut point to the lowest-energy window near target
+    start = max(0, target - search_frames)
+    reader.setpos(start)
+    raw = reader.readframes(2 * search_frames)
+    dtype = SAMPLE_TYPES.get(reader.getsampwidth())
+    if dtype is None or not raw:
+        return target
+
+    samples = np.frombuffer(raw, dtype=dtype).astype(np.float32)
+    if dtype is np.uint8:
+        samples -= 128
+    samples = samples.reshape(-1, reader.getnchannels()).mean(axis=1)
+
+    windows = len(samples) // window_frames
+    if windows < 2:
+        return target
+    energy = np.square(samples[:windows * window_frames]).reshape(windows, window_frames).mean(axis=1)
+    return start + int(np.argmin(energy)) * window_frames + window_frames // 2
+
+
+def plan_segments(reader, segment_seconds=SEGMENT_SECONDS, overlap_seconds=OVERLAP_SECONDS):
+    # (start_frame, end_frame) pairs; each segment runs overlap_seconds past
+    # the next one's start so words cut at a boundary are heard in full
+    rate = reader.getframerate()
+    total = reader.getnframes()
+    segment = max(1, int(segment_seconds * rate))
+    overlap = int(overlap_seconds * rate)
+    # Short segments search less than half a segment either side, so a cut
+    # can never land back at or before the segment's start
+    search = min(int(SILENCE_SEARCH_SECONDS * rate), (segment - 1) // 2)
+    window = max(1, int(SILENCE_WINDOW_SECONDS * rate))
+
+    segments = []
+    start = 0
+    while total - start > segment + overlap:
+        cut = quietest_frame(reader, start + segment, search, window)
+        if cut <= start:
+            cut = start + segment
+        segments.append((start, min(total, cut + overlap)))
+        start = cut
+    segments.append((start, total))
+    return segments
+
+
+def read_segment(reader, lock, start, end):
+    # The wave reader is shared, so seek+read happens under a lock and each
+    # worker only ever holds its own segment in memory
+    with lock:
+        reader.setpos(start)
+        frames = reader.readframes(end - start)
+        params = reader.getparams()
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as writer:
+        writer.setparams(params)
+        writer.writeframes(frames)
+    buffer.seek(0)
+    return buffer
+
+
+def with_retries(func, retries, backoff_seconds):
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff_seconds * 2 ** attempt)
+
+
+def normalize_word(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def overlap_words(overlap_seconds):
+    # Upper bound on how many words can be spoken in the overlap
+    return max(1, math.ceil(overlap_seconds * WORDS_PER_SECOND))
+
+
+def stitch(texts, max_overlap_words=overlap_words(OVERLAP_SECONDS), min_match_words=3, edge_words=EDGE_WORDS):
+    # Join consecutive segment transcripts, dropping the words both sides
+    # heard in the overlap. The shared run has to end at the tail of one
+    # segment and start at the head of the next, give or take edge_words
+    # words the cut may have garbled, so a phrase that is simply repeated
+    # elsewhere in the overlap window is never mistaken for it.
+    words = texts[0].split() if texts else []
+    for text in texts[1:]:
+        following = text.split()
+        tail = [normalize_word(w) for w in words[-max_overlap_words:]]
+        head = [normalize_word(w) for w in following[:max_overlap_words]]
+        match = longest_edge_match(tail, head, min_match_words, edge_words)
+        if match:
+            dropped, skipped = match
+            if dropped:
+                del words[-dropped:]
+            following = following[skipped:]
+        words.extend(following)
+    return " ".join(words)
+
+
+def longest_edge_match(tail, head, min_match_words, edge_words):
+    # (words to drop from the end of tail, words to skip at the start of
+    # head) for the longest run tail and head share across the cut, or None
+    for size in range(min(len(tail), len(head)), min_match_words - 1, -1):
+        for trailing in range(min(edge_words, len(tail) - size) + 1):
+            end = len(tail) - trailing
+            for leading in range(min(edge_words, len(head) - size) + 1):
+                if tail[end - size:end] == head[leading:leading + size]:
+                    return trailing, leading + size
+    return None
+
+
+class ChunkedTranscriber:
+    # Splits long WAV recordings into overlapping segments, transcribes them
+    # on a bounded pool, retries only the segments that fail, and stitches
+    # the pieces back together. Other formats are sent as a single request.
+
+    def __init__(self, transcribe, segment_seconds=SEGMENT_SECONDS, overlap_seconds=OVERLAP_SECONDS,
+                 workers=4, retries=2, backoff_seconds=1.0):
+        if segment_seconds <= 0 or overlap_seconds < 0:
+            raise ValueError("segment_seconds must be positive and overlap_seconds not negative")
+        self.transcribe = transcribe
+        self.segment_seconds = segment_seconds
+        self.overlap_seconds = overlap_seconds
+        self.workers = workers
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+
+    def __call__(self, f, filename, content_type=None):
+        try:
+            reader = wave.open(f, "rb")
+        except (wave.Error, EOFError):
+            reader = None
+        segments = plan_segments(reader, self.segment_seconds, self.overlap_seconds) if reader else []
+
+        if len(segments) <= 1:
+            def transcribe_whole():
+                f.seek(0)
+                return self.transcribe(f, filename, content_type)
+            return with_retries(transcribe_whole, self.retries, self.backoff_seconds)
+
+        lock = threading.Lock()
+        stem = filename.rsplit(".", 1)[0]
+
+        def transcribe_segment(indexed):
+            i, (start, end) = indexed
+            return with_retries(
+                lambda: self.transcribe(read_segment(reader, lock, start, end), f"{stem}-{i}.wav", "audio/wav"),
+                self.retries,
+                self.backoff_seconds
+            )
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="transcribe") as pool:
+            texts = list(pool.map(transcribe_segment, enumerate(segments)))
+        reader.close()
+
+        return stitch(texts, overlap_words(self.overlap_seconds))